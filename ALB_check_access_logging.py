@@ -1,10 +1,10 @@
-import boto3
 import argparse
+from aws_clients import get_client
 
 
 def check_access_logging_status(load_balancer_arn):
     """Check if access logging is enabled for a specific load balancer."""
-    elbv2_client = boto3.client("elbv2")
+    elbv2_client = get_client("elbv2")
 
     try:
         # Retrieve the current attributes for the given load balancer
@@ -40,7 +40,7 @@ def check_access_logging_status(load_balancer_arn):
 
 def check_all_load_balancers():
     """Check access logging status for all load balancers."""
-    elbv2_client = boto3.client("elbv2")
+    elbv2_client = get_client("elbv2")
 
     try:
         # Retrieve all load balancers
@@ -1,9 +1,9 @@
-import boto3
 import argparse
+from aws_clients import get_client
 
 
 def get_alb_subnets(alb_name):
-    elbv2 = boto3.client("elbv2")
+    elbv2 = get_client("elbv2")
     response = elbv2.describe_load_balancers(Names=[alb_name])
     subnets = [
         az["SubnetId"] for az in response["LoadBalancers"][0]["AvailabilityZones"]
@@ -12,7 +12,7 @@ def get_alb_subnets(alb_name):
 
 
 def is_public_subnet(subnet_id):
-    ec2 = boto3.client("ec2")
+    ec2 = get_client("ec2")
     response = ec2.describe_route_tables(
         Filters=[{"Name": "association.subnet-id", "Values": [subnet_id]}]
     )
@@ -28,7 +28,7 @@ def is_public_subnet(subnet_id):
 
 
 def get_target_group_arn(cluster_name, service_name):
-    ecs = boto3.client("ecs")
+    ecs = get_client("ecs")
     response = ecs.describe_services(cluster=cluster_name, services=[service_name])
     if not response["services"]:
         print(
@@ -45,7 +45,7 @@ def get_target_group_arn(cluster_name, service_name):
 
 
 def get_target_group_name(target_group_arn):
-    elbv2 = boto3.client("elbv2")
+    elbv2 = get_client("elbv2")
     response = elbv2.describe_target_groups(TargetGroupArns=[target_group_arn])
     if not response["TargetGroups"]:
         print(f"No target group found with ARN {target_group_arn}.")
@@ -54,7 +54,7 @@ def get_target_group_name(target_group_arn):
 
 
 def get_alb_from_target_group(target_group_arn):
-    elbv2 = boto3.client("elbv2")
+    elbv2 = get_client("elbv2")
     response = elbv2.describe_target_groups(TargetGroupArns=[target_group_arn])
     if not response["TargetGroups"]:
         print(f"No target group found with ARN {target_group_arn}.")
@@ -1,9 +1,9 @@
-import boto3
 import argparse
+from aws_clients import get_client
 
 
 def check_and_enable_logs(alb_arn, bucket_name):
-    client = boto3.client("elbv2")
+    client = get_client("elbv2")
     alb_name = alb_arn.split("/")[-2]
 
     # Check current attributes of the ALB
@@ -1,4 +1,4 @@
-import boto3
+from aws_clients import get_client
 
 
 def check_aws_config():
@@ -10,7 +10,7 @@ def check_aws_config():
     print(f"{separator}\nChecking AWS Config status...\n{separator}")
 
     # Initialize Boto3 client for AWS Config
-    config_service = boto3.client("config")
+    config_service = get_client("config")
 
     # List AWS Config rules
     print("Enabled Config Rules:")
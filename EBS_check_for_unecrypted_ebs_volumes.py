@@ -1,4 +1,4 @@
-import boto3
+from aws_clients import get_client
 
 
 def get_default_ebs_encryption(client):
@@ -35,7 +35,7 @@ def main():
     The main function to check EBS encryption settings and list unencrypted volumes.
     """
     # Create an EC2 client
-    client = boto3.client("ec2")
+    client = get_client("ec2")
 
     # Check and print whether encryption by default is enabled
     encryption_by_default = get_default_ebs_encryption(client)
@@ -1,10 +1,9 @@
 import argparse
-import boto3
+from aws_clients import get_client
 
 
-def check_security_groups(profile=None):
-    session = boto3.Session(profile_name=profile) if profile else boto3.Session()
-    ec2 = session.client("ec2")
+def check_security_groups(profile=None, session=None):
+    ec2 = session.client("ec2") if session else get_client("ec2", profile=profile)
 
     security_groups = ec2.describe_security_groups()["SecurityGroups"]
     counter = 0
@@ -44,6 +43,11 @@ def check_security_groups(profile=None):
                             )
 
 
+def run(session, args):
+    """Entry point for run-script-with-all-aws-profiles.py --in-process."""
+    check_security_groups(session=session)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Check AWS Security Groups for risky ingress rules."
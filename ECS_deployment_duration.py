@@ -1,10 +1,10 @@
-import boto3
 import argparse
 from datetime import datetime
+from aws_clients import get_client
 
 
 def get_all_clusters():
-    client = boto3.client("ecs")
+    client = get_client("ecs")
     paginator = client.get_paginator("list_clusters")
     cluster_arns = []
     for page in paginator.paginate():
@@ -13,7 +13,7 @@ def get_all_clusters():
 
 
 def get_all_services(cluster_name):
-    client = boto3.client("ecs")
+    client = get_client("ecs")
     paginator = client.get_paginator("list_services")
     service_arns = []
     for page in paginator.paginate(cluster=cluster_name):
@@ -22,7 +22,7 @@ def get_all_services(cluster_name):
 
 
 def get_deployments(cluster_name, service_name):
-    client = boto3.client("ecs")
+    client = get_client("ecs")
     response = client.describe_services(cluster=cluster_name, services=[service_name])
 
     deployments = response["services"][0]["deployments"]
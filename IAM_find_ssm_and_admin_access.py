@@ -1,61 +1,132 @@
 #!/usr/bin/env python3
-import boto3
+import argparse
+import functools
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# The IAM snapshot format and loader are shared with the iam-module checkers.
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "iam-module")
+)
+from iam_utils import (
+    DEFAULT_MAX_WORKERS,
+    fetch_policy_documents,
+    get_account_snapshot,
+    get_iam_client,
+    get_inline_policies,
+    get_policy_analysis,
+    get_policy_document,
+    load_policy_versions,
+)
+from iam_utils import get_managed_policies as get_attached_policy_arns
 
 # The purpose of the script is to be able to find what/who  has access to
 # log into an instance in an environment where only SSM sessions are the
 # only way to do so.
 
 
+# Verdicts of the policy predicates keyed by (predicate name, content hash),
+# so copies of the same inline policy on many entities share one verdict.
+policy_verdict_cache = {}
+
+
+# Function to hash a policy document's content, once per document object.
+# The hash is kept in the iam-module analysis cache next to the compiled policy.
+def get_policy_document_hash(policy):
+    analysis = get_policy_analysis(policy)
+    if "content_hash" not in analysis:
+        content = json.dumps(policy, sort_keys=True, default=str)
+        analysis["content_hash"] = hashlib.sha256(content.encode()).hexdigest()
+    return analysis["content_hash"]
+
+
+# Decorator that evaluates a policy predicate once per distinct document, so
+# the user, group and role passes all reuse the same verdicts
+def memoize_policy_verdict(predicate):
+    @functools.wraps(predicate)
+    def cached_predicate(policy):
+        cache_key = (predicate.__name__, get_policy_document_hash(policy))
+        if cache_key not in policy_verdict_cache:
+            policy_verdict_cache[cache_key] = predicate(policy)
+        return policy_verdict_cache[cache_key]
+
+    return cached_predicate
+
+
+# Function to call fn for every item on a worker pool, creating one if none is
+# given, and return the results in the same order
+def map_concurrently(fn, items, executor=None):
+    if executor is not None:
+        return list(executor.map(fn, items))
+    with ThreadPoolExecutor(max_workers=DEFAULT_MAX_WORKERS) as executor:
+        return list(executor.map(fn, items))
+
+
 # Function to retrieve all users and their attached policies
-def get_users_and_attached_policies():
-    iam = boto3.client("iam")
+def get_users_and_attached_policies(executor=None):
+    iam = get_iam_client()
     paginator = iam.get_paginator("list_users")
-    users = []
-    user_attached_policies = {}
-    for page in paginator.paginate():
-        for user in page["Users"]:
-            users.append(user)
-            policies = iam.list_attached_user_policies(UserName=user["UserName"])
-            user_attached_policies[user["UserName"]] = [
-                policy["PolicyArn"] for policy in policies["AttachedPolicies"]
-            ]
+    users = [user for page in paginator.paginate() for user in page["Users"]]
+    attached_policies = map_concurrently(
+        lambda user: get_attached_policy_arns(user["UserName"], "user"),
+        users,
+        executor,
+    )
+    user_attached_policies = {
+        user["UserName"]: policy_arns
+        for user, policy_arns in zip(users, attached_policies)
+    }
     return users, user_attached_policies
 
 
+# Function to list every member of a group, following get_group's pagination
+def get_group_member_names(group_name):
+    paginator = get_iam_client().get_paginator("get_group")
+    return [
+        user["UserName"]
+        for page in paginator.paginate(GroupName=group_name)
+        for user in page["Users"]
+    ]
+
+
 # Function to retrieve all groups and the groups that users belong to
-def get_groups_and_user_groups():
-    iam = boto3.client("iam")
+def get_groups_and_user_groups(executor=None):
+    iam = get_iam_client()
     paginator = iam.get_paginator("list_groups")
+    group_list = [group for page in paginator.paginate() for group in page["Groups"]]
+    details = map_concurrently(
+        lambda group: (
+            get_attached_policy_arns(group["GroupName"], "group"),
+            get_group_member_names(group["GroupName"]),
+        ),
+        group_list,
+        executor,
+    )
     groups = {}
     user_groups = {}
-    for page in paginator.paginate():
-        for group in page["Groups"]:
-            groups[group["GroupName"]] = group
-            group_policies = iam.list_attached_group_policies(
-                GroupName=group["GroupName"]
-            )
-            group["AttachedManagedPolicies"] = [
-                policy["PolicyArn"] for policy in group_policies["AttachedPolicies"]
-            ]
-            for user in iam.get_group(GroupName=group["GroupName"])["Users"]:
-                if user["UserName"] not in user_groups:
-                    user_groups[user["UserName"]] = []
-                user_groups[user["UserName"]].append(group["GroupName"])
+    for group, (policy_arns, member_names) in zip(group_list, details):
+        group["AttachedManagedPolicies"] = policy_arns
+        groups[group["GroupName"]] = group
+        for user_name in member_names:
+            if user_name not in user_groups:
+                user_groups[user_name] = []
+            user_groups[user_name].append(group["GroupName"])
     return groups, user_groups
 
 
-# Function to retrieve all managed policies
-def get_managed_policies():
-    iam = boto3.client("iam")
-    paginator = iam.get_paginator("list_policies")
-    policies = {}
-    for page in paginator.paginate(Scope="All"):
-        for policy in page["Policies"]:
-            if policy["Arn"] not in policies:
-                policies[policy["Arn"]] = iam.get_policy_version(
-                    PolicyArn=policy["Arn"], VersionId=policy["DefaultVersionId"]
-                )["PolicyVersion"]["Document"]
-    return policies
+# Function to retrieve the managed policies attached to users, groups or roles.
+# Only attached policies can grant access, so unattached AWS managed policies
+# are never downloaded. Documents are fetched concurrently into the iam-module
+# policy document cache, which analyze_attached_policies reads as well.
+def get_managed_policies(policy_arns=None):
+    iam = get_iam_client()
+    attached_policy_arns = load_policy_versions(iam, only_attached=True)
+    if policy_arns is None:
+        policy_arns = attached_policy_arns
+    return fetch_policy_documents(list(dict.fromkeys(policy_arns)))
 
 
 # Function to check if a user has admin access through a group
@@ -89,6 +160,7 @@ def does_user_have_session_manager_access_through_group(
 
 
 # Function to check if a policy has admin access
+@memoize_policy_verdict
 def has_admin_access(policy):
     if "Statement" not in policy:
         return False
@@ -108,6 +180,7 @@ def has_admin_access(policy):
 
 
 # Function to check if a policy has Session Manager access
+@memoize_policy_verdict
 def has_session_manager_access(policy):
     if "Statement" not in policy:
         return False
@@ -156,12 +229,7 @@ def analyze_attached_policies(policy_arns, iam, iam_entity_type, entity_name):
     admin_users = []
     session_manager_users = []
     for policy_arn in policy_arns:
-        policy = iam.get_policy_version(
-            PolicyArn=policy_arn,
-            VersionId=iam.get_policy(PolicyArn=policy_arn)["Policy"][
-                "DefaultVersionId"
-            ],
-        )["PolicyVersion"]["Document"]
+        policy = get_policy_document(iam, policy_arn)
         if has_admin_access(policy):
             admin_users.append(entity_name)
         if has_session_manager_access(policy):
@@ -196,32 +264,48 @@ def has_user_session_manager_access(
 
 
 # Function to retrieve all roles and their attached policies
-def get_roles_and_attached_policies():
-    iam = boto3.client("iam")
+def get_roles_and_attached_policies(executor=None):
+    iam = get_iam_client()
     paginator = iam.get_paginator("list_roles")
-    roles = []
+    roles = [role for page in paginator.paginate() for role in page["Roles"]]
+    details = map_concurrently(
+        lambda role: (
+            get_attached_policy_arns(role["RoleName"], "role"),
+            get_inline_policies(role["RoleName"], "role"),
+        ),
+        roles,
+        executor,
+    )
     role_attached_policies = {}
     role_inline_policies = {}
-    for page in paginator.paginate():
-        for role in page["Roles"]:
-            roles.append(role)
-            policies = iam.list_attached_role_policies(RoleName=role["RoleName"])
-            role_attached_policies[role["RoleName"]] = [
-                policy["PolicyArn"] for policy in policies["AttachedPolicies"]
+    for role, (policy_arns, inline_policies) in zip(roles, details):
+        role_attached_policies[role["RoleName"]] = policy_arns
+        if inline_policies:
+            role_inline_policies[role["RoleName"]] = [
+                policy_document for _, policy_document in inline_policies
             ]
-            inline_policies = iam.list_role_policies(RoleName=role["RoleName"])[
-                "PolicyNames"
-            ]
-            for inline_policy in inline_policies:
-                inline_policy_document = iam.get_role_policy(
-                    RoleName=role["RoleName"], PolicyName=inline_policy
-                )["PolicyDocument"]
-                if role["RoleName"] not in role_inline_policies:
-                    role_inline_policies[role["RoleName"]] = []
-                role_inline_policies[role["RoleName"]].append(inline_policy_document)
     return roles, role_attached_policies, role_inline_policies
 
 
+# Function to crawl users, groups and roles at the same time, sharing one pool
+# of workers for the per-entity calls. The three crawl threads make their own
+# list calls, so the entity pool is sized to keep the total number of
+# concurrent calls within the IAM client's connection pool.
+def crawl_entities(max_workers=DEFAULT_MAX_WORKERS):
+    crawls = [
+        get_users_and_attached_policies,
+        get_groups_and_user_groups,
+        get_roles_and_attached_policies,
+    ]
+    entity_workers = max(1, max_workers - len(crawls))
+    with ThreadPoolExecutor(max_workers=entity_workers) as entity_executor:
+        with ThreadPoolExecutor(max_workers=len(crawls)) as crawl_executor:
+            futures = [
+                crawl_executor.submit(crawl, entity_executor) for crawl in crawls
+            ]
+            return [future.result() for future in futures]
+
+
 # Function to check if a role has admin access
 def has_role_admin_access(role, policies, role_attached_policies, role_inline_policies):
     rolename = role["RoleName"]
@@ -254,20 +338,86 @@ def has_role_session_manager_access(
     return False
 
 
-# Main function
-def main():
-    # Retrieve all users and attached policies
-    users, user_attached_policies = get_users_and_attached_policies()
-    # Retrieve all groups and user groups
-    groups, user_groups = get_groups_and_user_groups()
-    # Retrieve all roles and attached policies
-    (
+# Function to build this script's lookups from an iam-module account snapshot
+def get_entities_from_snapshot(snapshot):
+    users = [{"UserName": user_name} for user_name in snapshot["users"]]
+    user_attached_policies = {
+        user_name: user["ManagedPolicies"]
+        for user_name, user in snapshot["users"].items()
+    }
+    groups = {
+        group_name: {
+            "GroupName": group_name,
+            "AttachedManagedPolicies": group["ManagedPolicies"],
+        }
+        for group_name, group in snapshot["groups"].items()
+    }
+    user_groups = {
+        user_name: user["Groups"]
+        for user_name, user in snapshot["users"].items()
+        if user["Groups"]
+    }
+    roles = [{"RoleName": role_name} for role_name in snapshot["roles"]]
+    role_attached_policies = {
+        role_name: role["ManagedPolicies"]
+        for role_name, role in snapshot["roles"].items()
+    }
+    role_inline_policies = {
+        role_name: list(role["InlinePolicies"].values())
+        for role_name, role in snapshot["roles"].items()
+        if role["InlinePolicies"]
+    }
+    policies = {
+        policy_arn: policy["Document"]
+        for policy_arn, policy in snapshot["policies"].items()
+    }
+    return (
+        users,
+        user_attached_policies,
+        groups,
+        user_groups,
         roles,
         role_attached_policies,
         role_inline_policies,
-    ) = get_roles_and_attached_policies()
-    # Retrieve all managed policies
-    policies = get_managed_policies()
+        policies,
+    )
+
+
+# Main function
+def main(snapshot_path=None):
+    if snapshot_path:
+        # Answer from the saved snapshot, pulling it once if it does not exist
+        (
+            users,
+            user_attached_policies,
+            groups,
+            user_groups,
+            roles,
+            role_attached_policies,
+            role_inline_policies,
+            policies,
+        ) = get_entities_from_snapshot(
+            get_account_snapshot(get_iam_client(), snapshot_path)
+        )
+    else:
+        # Retrieve all users, groups and roles with their attached policies
+        (
+            (users, user_attached_policies),
+            (groups, user_groups),
+            (roles, role_attached_policies, role_inline_policies),
+        ) = crawl_entities()
+        # Retrieve the managed policies seen in any attachment
+        policies = get_managed_policies(
+            [
+                policy_arn
+                for attachments in [
+                    *user_attached_policies.values(),
+                    *(group["AttachedManagedPolicies"] for group in groups.values()),
+                    *role_attached_policies.values(),
+                ]
+                for policy_arn in attachments
+            ]
+        )
 
     # Output users with admin or Session Manager access
     print("\n=== Users ===\n")
@@ -308,4 +458,12 @@ def main():
 
 # Entry point for script execution
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(
+        description="Find users and roles with admin or Session Manager access."
+    )
+    parser.add_argument(
+        "--snapshot",
+        help="Path to an IAM snapshot file (see iam-module). It is created on first use and answered from offline afterwards.",
+    )
+    args = parser.parse_args()
+    main(args.snapshot)
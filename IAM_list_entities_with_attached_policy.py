@@ -1,9 +1,9 @@
-import boto3
 import argparse
+from aws_clients import get_client
 
 
 def list_entities_with_policy(policy_arn):
-    iam = boto3.client("iam")
+    iam = get_client("iam")
 
     entities = {"User": [], "Role": [], "Group": []}
 
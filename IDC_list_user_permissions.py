@@ -1,8 +1,41 @@
-import boto3
+import argparse
+import contextlib
+import csv
+import gzip
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from aws_clients import get_client
 
 ## ****This script assumes that permissions and accounts are managed
 ## through groups, not users. This will not check user access****
 
+# Worker threads used to fetch group memberships concurrently.
+DEFAULT_MAX_WORKERS = 16
+# sso-admin throttles at a few tens of requests per second per account, so permission
+# sets are described by fewer workers; the client's adaptive retries absorb throttling.
+SSO_ADMIN_MAX_WORKERS = 8
+
+# Lookups shared by every user, keyed by (instance ARN, group ID or permission set ARN).
+group_assignments_cache = {}
+permissions_boundary_cache = {}
+
+# Columns of the jsonl and csv output, one row per (user, account, permission set).
+ROW_FIELDS = [
+    "UserId",
+    "UserName",
+    "Email",
+    "AccountId",
+    "PermissionSetArn",
+    "PermissionSetName",
+    "ViaGroups",
+    "AWSManagedPolicies",
+    "CustomerManagedPolicies",
+    "InlinePolicy",
+    "PermissionsBoundary",
+]
+
 
 def fetch_instance_and_identity_store_ids(sso_client):
     """Fetch the first available Instance ID and Identity Store ID."""
@@ -13,13 +46,11 @@ def fetch_instance_and_identity_store_ids(sso_client):
     return instance["InstanceArn"], instance["IdentityStoreId"]
 
 
-def list_users(identity_store_client, identity_store_id):
-    """List all users in AWS Identity Center."""
-    users = []
+def iter_users(identity_store_client, identity_store_id):
+    """Yield the users in AWS Identity Center one page at a time."""
     paginator = identity_store_client.get_paginator("list_users")
     for page in paginator.paginate(IdentityStoreId=identity_store_id):
-        users.extend(page["Users"])
-    return users
+        yield from page["Users"]
 
 
 def list_groups(identity_store_client, identity_store_id):
@@ -40,42 +71,74 @@ def list_group_memberships(identity_store_client, identity_store_id, group_id):
     return memberships
 
 
-def list_permission_sets(sso_admin_client, instance_arn):
+def build_membership_index(
+    identity_store_client, identity_store_id, groups, max_workers=DEFAULT_MAX_WORKERS
+):
+    """Fetch each group's members once, concurrently, and map each user ID to its group IDs."""
+    group_ids = [group["GroupId"] for group in groups]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        group_memberships = executor.map(
+            lambda group_id: list_group_memberships(
+                identity_store_client, identity_store_id, group_id
+            ),
+            group_ids,
+        )
+        user_groups = {}
+        for group_id, memberships in zip(group_ids, group_memberships):
+            for membership in memberships:
+                user_id = membership["MemberId"].get("UserId")
+                if user_id:
+                    user_groups.setdefault(user_id, []).append(group_id)
+    return user_groups
+
+
+def list_permission_sets(
+    sso_admin_client, instance_arn, max_workers=SSO_ADMIN_MAX_WORKERS
+):
     """Retrieve all permission sets including their names, accounts, and attached policies."""
-    permission_sets = {}
+    permission_set_arns = []
     paginator = sso_admin_client.get_paginator("list_permission_sets")
     for page in paginator.paginate(InstanceArn=instance_arn):
-        for permission_set_arn in page["PermissionSets"]:
-            detail = sso_admin_client.describe_permission_set(
-                InstanceArn=instance_arn, PermissionSetArn=permission_set_arn
-            )
-            managed_policies = list_managed_policies_in_permission_set(
-                sso_admin_client, instance_arn, permission_set_arn
-            )
-            customer_managed_policies = (
-                list_customer_managed_policies_in_permission_set(
-                    sso_admin_client, instance_arn, permission_set_arn
-                )
-            )
-            inline_policy = get_inline_policy_for_permission_set(
+        permission_set_arns.extend(page["PermissionSets"])
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        records = executor.map(
+            lambda permission_set_arn: describe_permission_set(
                 sso_admin_client, instance_arn, permission_set_arn
-            )
-            permission_sets[permission_set_arn] = {
-                "Name": detail["PermissionSet"]["Name"],
-                "Accounts": list_accounts_for_permission_set(
-                    sso_admin_client, instance_arn, permission_set_arn
-                ),
-                "AWSManagedPolicies": managed_policies,
-                "CustomerManagedPolicies": customer_managed_policies,
-                "InlinePolicy": inline_policy,
-            }
-    return permission_sets
+            ),
+            permission_set_arns,
+        )
+        return dict(zip(permission_set_arns, records))
 
 
-def list_managed_policies_in_permission_set(
-    sso_admin_client, instance_arn, permission_set_arn
-):
-    """List all managed policies attached to a permission set."""
+def describe_permission_set(sso_admin_client, instance_arn, permission_set_arn):
+    """Fetch the name, accounts, policies and boundary of one permission set into one record."""
+    detail = sso_admin_client.describe_permission_set(
+        InstanceArn=instance_arn, PermissionSetArn=permission_set_arn
+    )
+    managed_policies = list_managed_policy_attachments(
+        sso_admin_client, instance_arn, permission_set_arn
+    )
+    return {
+        "Name": detail["PermissionSet"]["Name"],
+        "Accounts": list_accounts_for_permission_set(
+            sso_admin_client, instance_arn, permission_set_arn
+        ),
+        "AWSManagedPolicies": [policy["Name"] for policy in managed_policies],
+        "AWSManagedPolicyArns": [policy["Arn"] for policy in managed_policies],
+        "CustomerManagedPolicies": list_customer_managed_policies_in_permission_set(
+            sso_admin_client, instance_arn, permission_set_arn
+        ),
+        "InlinePolicy": get_inline_policy_for_permission_set(
+            sso_admin_client, instance_arn, permission_set_arn
+        ),
+        "PermissionsBoundary": get_permissions_boundary_for_permission_set(
+            sso_admin_client, instance_arn, permission_set_arn
+        ),
+    }
+
+
+def list_managed_policy_attachments(sso_admin_client, instance_arn, permission_set_arn):
+    """List the name and ARN of each managed policy attached to a permission set."""
     policies = []
     paginator = sso_admin_client.get_paginator(
         "list_managed_policies_in_permission_set"
@@ -83,7 +146,7 @@ def list_managed_policies_in_permission_set(
     for page in paginator.paginate(
         InstanceArn=instance_arn, PermissionSetArn=permission_set_arn
     ):
-        policies.extend([policy["Name"] for policy in page["AttachedManagedPolicies"]])
+        policies.extend(page["AttachedManagedPolicies"])
     return policies
 
 
@@ -139,25 +202,42 @@ def list_accounts_for_permission_set(
 
 
 def list_account_assignments_for_group(sso_admin_client, instance_arn, group_id):
-    """List account assignments for a given group."""
-    response = sso_admin_client.list_account_assignments_for_principal(
-        InstanceArn=instance_arn, PrincipalId=group_id, PrincipalType="GROUP"
-    )
+    """List account assignments for a given group, fetched once per group."""
+    cache_key = (instance_arn, group_id)
+    if cache_key in group_assignments_cache:
+        return group_assignments_cache[cache_key]
     accounts = []
-    for assignment in response.get("AccountAssignments", []):
-        accounts.append(
-            {
-                "AccountId": assignment["AccountId"],
-                "PermissionSetArn": assignment["PermissionSetArn"],
-            }
-        )
+    paginator = sso_admin_client.get_paginator(
+        "list_account_assignments_for_principal"
+    )
+    for page in paginator.paginate(
+        InstanceArn=instance_arn, PrincipalId=group_id, PrincipalType="GROUP"
+    ):
+        for assignment in page.get("AccountAssignments", []):
+            accounts.append(
+                {
+                    "AccountId": assignment["AccountId"],
+                    "PermissionSetArn": assignment["PermissionSetArn"],
+                }
+            )
+    group_assignments_cache[cache_key] = accounts
     return accounts
 
 
 def get_permissions_boundary_for_permission_set(
     sso_admin_client, instance_arn, permission_set_arn
 ):
-    """Retrieve the permissions boundary attached to a permission set."""
+    """Retrieve the permissions boundary attached to a permission set, fetched once per set."""
+    cache_key = (instance_arn, permission_set_arn)
+    if cache_key not in permissions_boundary_cache:
+        permissions_boundary_cache[cache_key] = fetch_permissions_boundary(
+            sso_admin_client, instance_arn, permission_set_arn
+        )
+    return permissions_boundary_cache[cache_key]
+
+
+def fetch_permissions_boundary(sso_admin_client, instance_arn, permission_set_arn):
+    """Describe the permissions boundary attached to a permission set."""
     try:
         response = sso_admin_client.get_permissions_boundary_for_permission_set(
             InstanceArn=instance_arn, PermissionSetArn=permission_set_arn
@@ -182,98 +262,256 @@ def get_permissions_boundary_for_permission_set(
         return "Failed to retrieve permissions boundary"
 
 
-def main():
-    sso_client = boto3.client("sso-admin")
-    identity_store_client = boto3.client("identitystore")
+def get_user_email(user):
+    """Return the user's first email address."""
+    return user.get("Emails", [{"Value": "No email"}])[0]["Value"]
 
-    instance_arn, identity_store_id = fetch_instance_and_identity_store_ids(sso_client)
-    users = list_users(identity_store_client, identity_store_id)
-    groups = list_groups(identity_store_client, identity_store_id)
-    permission_sets = list_permission_sets(sso_client, instance_arn)
 
-    for user in users:
-        print("-" * 55)
-        print(
-            f"User: {user['UserName']}, Email: {user.get('Emails', [{'Value': 'No email'}])[0]['Value']}"
+def print_user_permissions(
+    sso_client, instance_arn, user, user_group_ids, group_names, permission_sets
+):
+    """Print the groups and per-account permissions of one user."""
+    print("-" * 55)
+    print(f"User: {user['UserName']}, Email: {get_user_email(user)}")
+    print(
+        f"  Groups: {', '.join(group_names[group_id] for group_id in user_group_ids)}"
+    )
+
+    # Collect accounts and permissions details based on group membership
+    accounts_permissions = {}
+    for group_id in user_group_ids:
+        group_accounts = list_account_assignments_for_group(
+            sso_client, instance_arn, group_id
         )
+        for account in group_accounts:
+            account_id = account["AccountId"]
+            if account_id not in accounts_permissions:
+                accounts_permissions[account_id] = {
+                    "PermissionSets": [],
+                    "AWSManagedPolicies": set(),
+                    "CustomerManagedPolicies": set(),
+                    "InlinePolicies": set(),
+                    "PermissionsBoundary": "No permissions boundary set",
+                }
+
+            for permission_set_arn in (
+                account["PermissionSetArn"]
+                if isinstance(account["PermissionSetArn"], list)
+                else [account["PermissionSetArn"]]
+            ):
+                if permission_set_arn in permission_sets:
+                    perm_set = permission_sets[permission_set_arn]
+                    accounts_permissions[account_id]["PermissionSets"].append(
+                        perm_set["Name"]
+                    )
+                    accounts_permissions[account_id]["AWSManagedPolicies"].update(
+                        perm_set.get("AWSManagedPolicies", [])
+                    )
+                    accounts_permissions[account_id]["CustomerManagedPolicies"].update(
+                        perm_set.get("CustomerManagedPolicies", [])
+                    )
+                    if perm_set.get("InlinePolicy"):
+                        accounts_permissions[account_id]["InlinePolicies"].add(
+                            perm_set["InlinePolicy"]
+                        )
+                    boundary_info = perm_set["PermissionsBoundary"]
+                    if boundary_info != "No permissions boundary set":
+                        accounts_permissions[account_id][
+                            "PermissionsBoundary"
+                        ] = boundary_info
 
-        # Determine groups this user is a member of
-        user_group_ids = [
-            group["GroupId"]
-            for group in groups
-            if any(
-                m["MemberId"]["UserId"] == user["UserId"]
-                for m in list_group_memberships(
-                    identity_store_client, identity_store_id, group["GroupId"]
-                )
-            )
-        ]
+    # Print account details only for accounts associated with user's groups
+    for account_id, details in accounts_permissions.items():
+        print(f"    Account ID: {account_id}")
+        print(f"      Permissions Boundary: {details['PermissionsBoundary']}")
         print(
-            f"  Groups: {', '.join([group['DisplayName'] for group in groups if group['GroupId'] in user_group_ids])}"
+            f"      Permission Sets: {', '.join(details['PermissionSets']) if details['PermissionSets'] else 'None'}"
+        )
+        print(
+            f"      AWS Managed Policies: {', '.join(details['AWSManagedPolicies']) if details['AWSManagedPolicies'] else 'None'}"
+        )
+        print(
+            f"      Customer Managed Policies: {', '.join(details['CustomerManagedPolicies']) if details['CustomerManagedPolicies'] else 'None'}"
+        )
+        print(
+            f"      Inline Policy: {', '.join(details['InlinePolicies']) if details['InlinePolicies'] else 'None'}"
         )
 
-        # Collect accounts and permissions details based on group membership
-        accounts_permissions = {}
-        for group_id in user_group_ids:
-            group_accounts = list_account_assignments_for_group(
+
+def user_permission_rows(
+    sso_client, instance_arn, user, user_group_ids, group_names, permission_sets
+):
+    """Yield one row per (account, permission set) the user gets through their groups."""
+    rows = {}
+    for group_id in user_group_ids:
+        for account in list_account_assignments_for_group(
+            sso_client, instance_arn, group_id
+        ):
+            permission_set_arn = account["PermissionSetArn"]
+            perm_set = permission_sets.get(permission_set_arn)
+            if perm_set is None:
+                continue
+            row_key = (account["AccountId"], permission_set_arn)
+            if row_key not in rows:
+                rows[row_key] = {
+                    "UserId": user["UserId"],
+                    "UserName": user["UserName"],
+                    "Email": get_user_email(user),
+                    "AccountId": account["AccountId"],
+                    "PermissionSetArn": permission_set_arn,
+                    "PermissionSetName": perm_set["Name"],
+                    "ViaGroups": [],
+                    "AWSManagedPolicies": perm_set["AWSManagedPolicies"],
+                    "CustomerManagedPolicies": perm_set["CustomerManagedPolicies"],
+                    "InlinePolicy": perm_set["InlinePolicy"],
+                    "PermissionsBoundary": perm_set["PermissionsBoundary"],
+                }
+            rows[row_key]["ViaGroups"].append(group_names[group_id])
+    yield from rows.values()
+
+
+def write_row(output_file, output_format, row, csv_writer=None):
+    """Write one row as a JSON line, or as CSV with list columns joined by ';'."""
+    if output_format == "csv":
+        csv_writer.writerow(
+            {
+                key: ";".join(value) if isinstance(value, list) else value
+                for key, value in row.items()
+            }
+        )
+    else:
+        output_file.write(json.dumps(row) + "\n")
+
+
+def load_idc_snapshot(sso_client, identity_store_client):
+    """Pull users, groups, memberships, permission sets and group assignments
+    into one snapshot that the report and iam-module/access_graph.py can read offline.
+    """
+    instance_arn, identity_store_id = fetch_instance_and_identity_store_ids(sso_client)
+    groups = list_groups(identity_store_client, identity_store_id)
+    permission_sets = list_permission_sets(sso_client, instance_arn)
+    membership_index = build_membership_index(
+        identity_store_client, identity_store_id, groups
+    )
+    group_ids = [group["GroupId"] for group in groups]
+    with ThreadPoolExecutor(max_workers=SSO_ADMIN_MAX_WORKERS) as executor:
+        group_assignments = executor.map(
+            lambda group_id: list_account_assignments_for_group(
                 sso_client, instance_arn, group_id
-            )
-            for account in group_accounts:
-                account_id = account["AccountId"]
-                if account_id not in accounts_permissions:
-                    accounts_permissions[account_id] = {
-                        "PermissionSets": [],
-                        "AWSManagedPolicies": set(),
-                        "CustomerManagedPolicies": set(),
-                        "InlinePolicies": set(),
-                        "PermissionsBoundary": "No permissions boundary set",
-                    }
-
-                for permission_set_arn in (
-                    account["PermissionSetArn"]
-                    if isinstance(account["PermissionSetArn"], list)
-                    else [account["PermissionSetArn"]]
-                ):
-                    if permission_set_arn in permission_sets:
-                        perm_set = permission_sets[permission_set_arn]
-                        accounts_permissions[account_id]["PermissionSets"].append(
-                            perm_set["Name"]
-                        )
-                        accounts_permissions[account_id]["AWSManagedPolicies"].update(
-                            perm_set.get("AWSManagedPolicies", [])
-                        )
-                        accounts_permissions[account_id][
-                            "CustomerManagedPolicies"
-                        ].update(perm_set.get("CustomerManagedPolicies", []))
-                        if perm_set.get("InlinePolicy"):
-                            accounts_permissions[account_id]["InlinePolicies"].add(
-                                perm_set["InlinePolicy"]
-                            )
-                        boundary_info = get_permissions_boundary_for_permission_set(
-                            sso_client, instance_arn, permission_set_arn
-                        )
-                        if boundary_info != "No permissions boundary set":
-                            accounts_permissions[account_id][
-                                "PermissionsBoundary"
-                            ] = boundary_info
-
-        # Print account details only for accounts associated with user's groups
-        for account_id, details in accounts_permissions.items():
-            print(f"    Account ID: {account_id}")
-            print(f"      Permissions Boundary: {details['PermissionsBoundary']}")
-            print(
-                f"      Permission Sets: {', '.join(details['PermissionSets']) if details['PermissionSets'] else 'None'}"
-            )
-            print(
-                f"      AWS Managed Policies: {', '.join(details['AWSManagedPolicies']) if details['AWSManagedPolicies'] else 'None'}"
-            )
-            print(
-                f"      Customer Managed Policies: {', '.join(details['CustomerManagedPolicies']) if details['CustomerManagedPolicies'] else 'None'}"
-            )
-            print(
-                f"      Inline Policy: {', '.join(details['InlinePolicies']) if details['InlinePolicies'] else 'None'}"
-            )
+            ),
+            group_ids,
+        )
+        group_assignments = dict(zip(group_ids, group_assignments))
+    return {
+        "InstanceArn": instance_arn,
+        "Users": [
+            {key: user[key] for key in ["UserId", "UserName", "Emails"] if key in user}
+            for user in iter_users(identity_store_client, identity_store_id)
+        ],
+        "Groups": {group["GroupId"]: group["DisplayName"] for group in groups},
+        "Memberships": membership_index,
+        "PermissionSets": permission_sets,
+        "GroupAssignments": group_assignments,
+    }
+
+
+def get_idc_snapshot(sso_client, identity_store_client, snapshot_path):
+    """Read the Identity Center snapshot from snapshot_path when it exists,
+    otherwise pull it and save it there as gzip-compressed JSON."""
+    if os.path.exists(snapshot_path):
+        with gzip.open(snapshot_path, "rt") as snapshot_file:
+            snapshot = json.load(snapshot_file)
+    else:
+        snapshot = load_idc_snapshot(sso_client, identity_store_client)
+        # Replace the file in one step so a failed write leaves no truncated snapshot
+        temporary_path = f"{snapshot_path}.tmp"
+        with gzip.open(temporary_path, "wt") as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+        os.replace(temporary_path, snapshot_path)
+    # Later lookups for these groups are answered from the snapshot
+    for group_id, assignments in snapshot["GroupAssignments"].items():
+        group_assignments_cache[(snapshot["InstanceArn"], group_id)] = assignments
+    return snapshot
+
+
+def main(output_format="text", output_path=None, snapshot_path=None):
+    sso_client = get_client("sso-admin", max_pool_connections=SSO_ADMIN_MAX_WORKERS)
+    identity_store_client = get_client(
+        "identitystore", max_pool_connections=DEFAULT_MAX_WORKERS
+    )
+
+    if snapshot_path:
+        snapshot = get_idc_snapshot(sso_client, identity_store_client, snapshot_path)
+        instance_arn = snapshot["InstanceArn"]
+        group_names = snapshot["Groups"]
+        permission_sets = snapshot["PermissionSets"]
+        membership_index = snapshot["Memberships"]
+        users = snapshot["Users"]
+    else:
+        instance_arn, identity_store_id = fetch_instance_and_identity_store_ids(
+            sso_client
+        )
+        groups = list_groups(identity_store_client, identity_store_id)
+        permission_sets = list_permission_sets(sso_client, instance_arn)
+        membership_index = build_membership_index(
+            identity_store_client, identity_store_id, groups
+        )
+        group_names = {group["GroupId"]: group["DisplayName"] for group in groups}
+        users = iter_users(identity_store_client, identity_store_id)
+
+    # Rows are written and flushed as each user is resolved
+    output_file = open(output_path, "w", newline="") if output_path else sys.stdout
+    try:
+        if output_format == "text":
+            with contextlib.redirect_stdout(output_file):
+                for user in users:
+                    print_user_permissions(
+                        sso_client,
+                        instance_arn,
+                        user,
+                        membership_index.get(user["UserId"], []),
+                        group_names,
+                        permission_sets,
+                    )
+            return
+
+        csv_writer = None
+        if output_format == "csv":
+            csv_writer = csv.DictWriter(output_file, fieldnames=ROW_FIELDS)
+            csv_writer.writeheader()
+        for user in users:
+            for row in user_permission_rows(
+                sso_client,
+                instance_arn,
+                user,
+                membership_index.get(user["UserId"], []),
+                group_names,
+                permission_sets,
+            ):
+                write_row(output_file, output_format, row, csv_writer)
+            output_file.flush()
+    finally:
+        if output_path:
+            output_file.close()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(
+        description="List the accounts and permission sets each Identity Center user gets through their groups."
+    )
+    parser.add_argument(
+        "--format",
+        choices=["text", "jsonl", "csv"],
+        default="text",
+        help="text prints a report per user; jsonl and csv stream one row per (user, account, permission set).",
+    )
+    parser.add_argument(
+        "--output",
+        help="File to write the report or rows to (default: standard output).",
+    )
+    parser.add_argument(
+        "--snapshot",
+        help="Read Identity Center from this gzip JSON snapshot, or pull and save it there if the file does not exist.",
+    )
+    args = parser.parse_args()
+    main(args.format, args.output, args.snapshot)
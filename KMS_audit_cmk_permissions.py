@@ -1,10 +1,10 @@
-import boto3
 import json
 import re
+from aws_clients import get_client
 
 
 def list_cmk_administrators():
-    kms_client = boto3.client("kms")
+    kms_client = get_client("kms")
     response = kms_client.list_keys()
     keys = response["Keys"]
 
@@ -1,8 +1,8 @@
-import boto3
+from aws_clients import get_client
 
 
 def list_rds_instances_encryption_status():
-    client = boto3.client("rds")
+    client = get_client("rds")
 
     paginator = client.get_paginator("describe_db_instances")
     page_iterator = paginator.paginate()
@@ -1,11 +1,11 @@
-import boto3
+from aws_clients import get_client
 
 
 def list_unencrypted_s3_buckets():
     """
     List all S3 buckets that do not have default encryption enabled.
     """
-    s3_client = boto3.client("s3")
+    s3_client = get_client("s3")
 
     buckets = s3_client.list_buckets()["Buckets"]
 
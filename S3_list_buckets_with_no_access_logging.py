@@ -1,11 +1,11 @@
-import boto3
 import argparse
 from botocore.exceptions import ClientError
+from aws_clients import get_client
 
 
 def get_s3_client():
     """Create an S3 client using boto3."""
-    return boto3.client("s3")
+    return get_client("s3")
 
 
 def get_buckets_with_tag(s3_client, tag_key, tag_value):
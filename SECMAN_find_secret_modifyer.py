@@ -1,15 +1,39 @@
 import argparse
+import fnmatch
 import json
-import boto3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from aws_clients import get_client
+from cloudtrail_lookup import DEFAULT_SLICES, scan_events
+from cloudtrail_store import EventStore
 
 """
 Important: this will look for events under a specific name or ARN, which means that if the secret is being searched for or is being modified or whatever the API call is with the ARN, you need to put that as the name argument.
 """
 
 
+relevant_events = [
+    "CreateSecret",
+    "DeleteSecret",
+    "PutSecretValue",
+    "RestoreSecret",
+    "UpdateSecret",
+]
+SECRETS_MANAGER_EVENT_SOURCE = "secretsmanager.amazonaws.com"
+
+# Decoded CloudTrailEvent payloads keyed by EventId, so each event's JSON is
+# parsed at most once.
+event_details = {}
+
+
+def get_event_detail(event):
+    if event["EventId"] not in event_details:
+        event_details[event["EventId"]] = json.loads(event["CloudTrailEvent"])
+    return event_details[event["EventId"]]
+
+
 def query_cloudtrail(secret_name, start_time, end_time):
-    client = boto3.client("cloudtrail")
+    client = get_client("cloudtrail")
     paginator = client.get_paginator("lookup_events")
     response_iterator = paginator.paginate(
         LookupAttributes=[
@@ -22,26 +46,147 @@ def query_cloudtrail(secret_name, start_time, end_time):
         EndTime=end_time,
     )
 
-    relevant_events = [
-        "CreateSecret",
-        "DeleteSecret",
-        "PutSecretValue",
-        "RestoreSecret",
-        "UpdateSecret",
-        "PutSecretValue",
-    ]
-
     events = []
     for response in response_iterator:
         for event in response["Events"]:
-            event_detail = json.loads(event["CloudTrailEvent"])
-            if event_detail["eventName"] in relevant_events:
+            # LookupEvents returns the event name next to the payload
+            if event["EventName"] in relevant_events:
                 events.append(event)
     return events
 
 
+def scan_modification_events(start_time, end_time, slices=DEFAULT_SLICES):
+    # Look up each modification event name at the same time, so reads of busy
+    # secrets are never downloaded, and keep only Secrets Manager's events
+    def scan(event_name):
+        return [
+            event
+            for event in scan_events(
+                start_time,
+                end_time,
+                {"AttributeKey": "EventName", "AttributeValue": event_name},
+                slices,
+            )
+            if event.get("EventSource") == SECRETS_MANAGER_EVENT_SOURCE
+        ]
+
+    with ThreadPoolExecutor(max_workers=len(relevant_events)) as executor:
+        return [
+            event for events in executor.map(scan, relevant_events) for event in events
+        ]
+
+
+def query_modification_events(secret_name, start_time, end_time, slices=DEFAULT_SLICES):
+    events = [
+        event
+        for event in scan_modification_events(start_time, end_time, slices)
+        if any(
+            resource.get("ResourceName") == secret_name
+            for resource in event.get("Resources", [])
+        )
+    ]
+    return sorted(events, key=lambda event: event["EventTime"], reverse=True)
+
+
+def resolve_secrets(patterns):
+    # Match names against globs (e.g. "prod/*") and ARNs exactly, with one
+    # paginated list_secrets call for all of them. Secrets scheduled for
+    # deletion are included, since their DeleteSecret/RestoreSecret history
+    # is usually what the audit is after.
+    client = get_client("secretsmanager")
+    paginator = client.get_paginator("list_secrets")
+    secrets = []
+    matched_patterns = set()
+    for page in paginator.paginate(IncludePlannedDeletion=True):
+        for secret in page["SecretList"]:
+            matching = {
+                pattern
+                for pattern in patterns
+                if secret["ARN"] == pattern
+                or fnmatch.fnmatchcase(secret["Name"], pattern)
+            }
+            if matching:
+                matched_patterns |= matching
+                secrets.append(secret)
+
+    for pattern in patterns:
+        if pattern in matched_patterns:
+            continue
+        if any(character in pattern for character in "*?["):
+            print(f"No secret matches '{pattern}'.")
+        else:
+            # Fully deleted secrets are no longer listed, but their events are
+            # still recorded under the literal name or ARN
+            print(
+                f"No current secret matches '{pattern}', searching for it as a deleted secret."
+            )
+            if pattern.startswith("arn:"):
+                # Secret ARNs end in the name plus "-" and six random characters
+                name = pattern.split(":secret:", 1)[-1][:-7]
+                secrets.append({"Name": name, "ARN": pattern})
+            else:
+                secrets.append({"Name": pattern, "ARN": pattern})
+    return secrets
+
+
+def query_secrets_batch(secrets, start_time, end_time, slices=DEFAULT_SLICES):
+    # One pass over the modification events in the window, routed in memory
+    # to each secret by the name or ARN the event was recorded under
+    secret_events = {secret["Name"]: [] for secret in secrets}
+    secret_keys = {}
+    for secret in secrets:
+        secret_keys[secret["Name"]] = secret["Name"]
+        secret_keys[secret["ARN"]] = secret["Name"]
+    for event in scan_modification_events(start_time, end_time, slices):
+        matched = {
+            secret_keys[resource.get("ResourceName")]
+            for resource in event.get("Resources", [])
+            if resource.get("ResourceName") in secret_keys
+        }
+        for secret_name in matched:
+            secret_events[secret_name].append(event)
+    for events in secret_events.values():
+        events.sort(key=lambda event: event["EventTime"], reverse=True)
+    return secret_events
+
+
+def query_event_store(
+    secret_name,
+    start_time,
+    end_time,
+    store_path=None,
+    sync=True,
+    by_event_name=False,
+):
+    # Fetch only what the local store is missing, then answer from it. Synced
+    # by event name, the store covers every secret's modifications at once.
+    store = EventStore(store_path)
+    if sync:
+        if by_event_name:
+            lookup_attributes = [
+                {"AttributeKey": "EventName", "AttributeValue": event_name}
+                for event_name in relevant_events
+            ]
+        else:
+            lookup_attributes = [
+                {"AttributeKey": "ResourceName", "AttributeValue": secret_name}
+            ]
+        for lookup_attribute in lookup_attributes:
+            store.sync(start_time, end_time, lookup_attribute)
+    return [
+        event
+        for event in store.query(
+            start_time,
+            end_time,
+            event_names=relevant_events,
+            resource_name=secret_name,
+        )
+        if not by_event_name or event.get("EventSource") == SECRETS_MANAGER_EVENT_SOURCE
+    ]
+
+
 def format_event(event):
-    event_detail = json.loads(event["CloudTrailEvent"])
+    event_detail = get_event_detail(event)
 
     return {
         "EventTime": event["EventTime"],
@@ -59,7 +204,18 @@ def main():
         description="Query AWS CloudTrail for secret modifications."
     )
     parser.add_argument(
-        "secret_name_or_arn", help="The name or ARN of the AWS Secrets Manager secret."
+        "secret_name_or_arn",
+        nargs="?",
+        help="The name or ARN of the AWS Secrets Manager secret.",
+    )
+    parser.add_argument(
+        "--secrets",
+        nargs="+",
+        help="Batch mode: secret names, name globs (e.g. 'prod/*') or ARNs to audit with a single scan of the modification events.",
+    )
+    parser.add_argument(
+        "--secrets-file",
+        help="Batch mode: file with one secret name, glob or ARN per line.",
     )
     parser.add_argument(
         "--days",
@@ -67,12 +223,77 @@ def main():
         required=True,
         help="Number of days back to look for events.",
     )
+    parser.add_argument(
+        "--by-event-name",
+        action="store_true",
+        help="Look up the modification events by name instead of every event on the secret. Faster for secrets that are read often. With --cached, the store is synced by event name.",
+    )
+    parser.add_argument(
+        "--cached",
+        action="store_true",
+        help="Sync new events into the local event store and answer from it.",
+    )
+    parser.add_argument(
+        "--no-sync",
+        action="store_true",
+        help="With --cached, answer from the local event store without calling CloudTrail.",
+    )
+    parser.add_argument(
+        "--store",
+        help="Path of the local event store (default: ~/.cache/cloudtrail-events/<profile>-<region>.sqlite).",
+    )
     args = parser.parse_args()
 
     end_time = datetime.utcnow()
     start_time = end_time - timedelta(days=args.days)
 
-    events = query_cloudtrail(args.secret_name_or_arn, start_time, end_time)
+    patterns = list(args.secrets or [])
+    if args.secrets_file:
+        with open(args.secrets_file) as secrets_file:
+            patterns.extend(line.strip() for line in secrets_file if line.strip())
+    if patterns:
+        if args.secret_name_or_arn:
+            parser.error(
+                "give either a secret name or ARN, or --secrets/--secrets-file, not both"
+            )
+        if args.cached or args.no_sync or args.store:
+            parser.error(
+                "--cached, --no-sync and --store are not supported with --secrets/--secrets-file"
+            )
+        secrets = resolve_secrets(patterns)
+        if not secrets:
+            print("No secrets match the specified names, globs or ARNs.")
+            return
+        secret_events = query_secrets_batch(secrets, start_time, end_time)
+        print(
+            json.dumps(
+                {
+                    secret_name: [format_event(event) for event in events]
+                    for secret_name, events in secret_events.items()
+                },
+                indent=4,
+                default=str,
+            )
+        )
+        return
+    if not args.secret_name_or_arn:
+        parser.error("give a secret name or ARN, or --secrets/--secrets-file")
+
+    if args.cached:
+        events = query_event_store(
+            args.secret_name_or_arn,
+            start_time,
+            end_time,
+            args.store,
+            not args.no_sync,
+            args.by_event_name,
+        )
+    elif args.by_event_name:
+        events = query_modification_events(
+            args.secret_name_or_arn, start_time, end_time
+        )
+    else:
+        events = query_cloudtrail(args.secret_name_or_arn, start_time, end_time)
 
     if events:
         formatted_events = [format_event(event) for event in events]
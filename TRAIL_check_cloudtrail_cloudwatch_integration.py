@@ -1,4 +1,4 @@
-import boto3
+from aws_clients import get_client
 
 
 def list_trails_and_log_groups():
@@ -6,7 +6,7 @@ def list_trails_and_log_groups():
     List all CloudTrail trails and their associated CloudWatch Logs log groups.
     """
     # Create a CloudTrail client
-    client = boto3.client("cloudtrail")
+    client = get_client("cloudtrail")
 
     # Call describe_trails to fetch trail details
     response = client.describe_trails()
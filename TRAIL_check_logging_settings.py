@@ -1,11 +1,11 @@
-import boto3
 from botocore.exceptions import ClientError
+from aws_clients import get_client
 
 
 def get_cloudtrail_info():
     """Retrieve CloudTrail configuration and associated S3 bucket details."""
-    cloudtrail_client = boto3.client("cloudtrail")
-    s3_client = boto3.client("s3")
+    cloudtrail_client = get_client("cloudtrail")
+    s3_client = get_client("s3")
 
     try:
         trails = cloudtrail_client.describe_trails(includeShadowTrails=True)
@@ -1,32 +1,56 @@
-import boto3
 import argparse
 import re
 import json
 from datetime import datetime, timedelta
+from cloudtrail_lookup import DEFAULT_SLICES, scan_events
+from cloudtrail_store import EventStore
 
 
-def get_cloudtrail_events(event_name, start_time, end_time):
-    client = boto3.client("cloudtrail")
-    response = client.lookup_events(
-        LookupAttributes=[{"AttributeKey": "EventName", "AttributeValue": event_name}],
-        StartTime=start_time,
-        EndTime=end_time,
+def get_cloudtrail_events(event_name, start_time, end_time, slices=DEFAULT_SLICES):
+    # Every page of every time slice, streamed as it arrives
+    return scan_events(
+        start_time,
+        end_time,
+        {"AttributeKey": "EventName", "AttributeValue": event_name},
+        slices,
+    )
+
+
+def get_cached_events(
+    event_name,
+    resource_name_pattern,
+    start_time,
+    end_time,
+    slices=DEFAULT_SLICES,
+    store_path=None,
+    sync=True,
+):
+    # Fetch only what the local store is missing, then answer from it
+    store = EventStore(store_path)
+    if sync:
+        store.sync(
+            start_time,
+            end_time,
+            {"AttributeKey": "EventName", "AttributeValue": event_name},
+            slices,
+        )
+    return store.query(
+        start_time,
+        end_time,
+        event_names=[event_name],
+        resource_pattern=resource_name_pattern,
     )
-    return response
 
 
 def filter_events_by_resource_name(events, resource_name_pattern):
     regex = re.compile(resource_name_pattern)
-    filtered_events = []
 
-    for event in events["Events"]:
-        for resource in event["Resources"]:
+    for event in events:
+        for resource in event.get("Resources", []):
             if regex.search(resource["ResourceName"]):
-                filtered_events.append(event)
+                yield event
                 break
 
-    return filtered_events
-
 
 def format_event_time(event_time):
     return event_time.strftime("%Y-%m-%d %H:%M:%S %Z")
@@ -42,9 +66,11 @@ def print_event_summary(events):
             "AccessKeyId": event.get("AccessKeyId"),
             "Username": event.get("Username"),
             "EventTime": format_event_time(event.get("EventTime")),
-            "ResourceName": event["Resources"][0].get("ResourceName")
-            if event.get("Resources")
-            else "N/A",
+            "ResourceName": (
+                event["Resources"][0].get("ResourceName")
+                if event.get("Resources")
+                else "N/A"
+            ),
             "RoleArn": role_arn,
         }
 
@@ -75,6 +101,31 @@ def main():
         required=True,
         help="Regular expression pattern to filter resource names.",
     )
+    parser.add_argument(
+        "--slices",
+        type=int,
+        default=DEFAULT_SLICES,
+        help="Number of time slices scanned at the same time (default: %(default)s). Calls stay within the LookupEvents rate limit.",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print events as soon as their page arrives instead of newest first. Events from different time slices are interleaved.",
+    )
+    parser.add_argument(
+        "--cached",
+        action="store_true",
+        help="Sync new events into the local event store and answer from it.",
+    )
+    parser.add_argument(
+        "--no-sync",
+        action="store_true",
+        help="With --cached, answer from the local event store without calling CloudTrail.",
+    )
+    parser.add_argument(
+        "--store",
+        help="Path of the local event store (default: ~/.cache/cloudtrail-events/<profile>-<region>.sqlite).",
+    )
 
     args = parser.parse_args()
     event_name = args.event_name
@@ -84,8 +135,24 @@ def main():
     end_time = datetime.utcnow()
     start_time = end_time - timedelta(days=days)
 
-    events = get_cloudtrail_events(event_name, start_time, end_time)
-    filtered_events = filter_events_by_resource_name(events, resource_name_pattern)
+    if args.cached:
+        filtered_events = get_cached_events(
+            event_name,
+            resource_name_pattern,
+            start_time,
+            end_time,
+            args.slices,
+            args.store,
+            not args.no_sync,
+        )
+    else:
+        events = get_cloudtrail_events(event_name, start_time, end_time, args.slices)
+        filtered_events = filter_events_by_resource_name(events, resource_name_pattern)
+        if not args.stream:
+            # Slices arrive interleaved, so restore the newest-first order
+            filtered_events = sorted(
+                filtered_events, key=lambda event: event["EventTime"], reverse=True
+            )
 
     print_event_summary(filtered_events)
 
@@ -1,4 +1,6 @@
-import boto3
+import argparse
+import json
+from aws_clients import get_client
 
 
 def list_vpcs(ec2_client):
@@ -23,9 +25,9 @@ def check_flow_logs(ec2_client, vpc_id):
         return "ERROR"
 
 
-def main():
+def main(session=None, json_output=False):
     """Main function to check VPC Flow Logs status."""
-    ec2_client = boto3.client("ec2")
+    ec2_client = session.client("ec2") if session else get_client("ec2")
 
     vpcs = list_vpcs(ec2_client)
     if not vpcs:
@@ -35,8 +37,26 @@ def main():
     for vpc in vpcs:
         vpc_id = vpc["VpcId"]
         status = check_flow_logs(ec2_client, vpc_id)
-        print(f"VPC ID: {vpc_id}, Flow Logs Status: {status}")
+        if json_output:
+            print(json.dumps({"vpc_id": vpc_id, "flow_logs": status}))
+        else:
+            print(f"VPC ID: {vpc_id}, Flow Logs Status: {status}")
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Check VPC Flow Logs status.")
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print one JSON object per VPC instead of text.",
+    )
+    return parser.parse_args(args)
+
+
+def run(session, args):
+    """Entry point for run-script-with-all-aws-profiles.py --in-process."""
+    main(session, parse_args(args).json)
 
 
 if __name__ == "__main__":
-    main()
+    main(json_output=parse_args().json)
@@ -1,9 +1,9 @@
 import argparse
-import boto3
+from aws_clients import get_client
 
 
 def check_nacls():
-    client = boto3.client("ec2")
+    client = get_client("ec2")
     response = client.describe_network_acls()
     nacls = response["NetworkAcls"]
 
@@ -1,9 +1,11 @@
-import boto3
 import sys
 import os
 import time
 import csv
+import argparse
+import threading
 from contextlib import suppress
+from aws_clients import get_client, get_enabled_regions, run_in_regions
 
 # Hard-coded output location for the report.
 bucketEncryptionReportLocation = "/home/wil031583/Documents/"
@@ -14,9 +16,12 @@ bucketEncryptionReport = (
     + ".csv"
 )
 
-# Define the AWS Regions to check.
+# Define the AWS Regions to check by default.
 regions = ["us-east-1", "us-west-2"]
 
+# Regions are audited concurrently, so appends to the report are serialised.
+report_lock = threading.Lock()
+
 # Create empty output file to store report.
 open(bucketEncryptionReport, "a").close()
 
@@ -35,80 +40,112 @@ def appendHeaders():
 
 # Create function to print the data into the CSV file.
 def report_info(file_name, details):
-    print(
-        details,
-        file=open(file_name, "a"),
-    )
+    with report_lock, open(file_name, "a") as report_file:
+        print(details, file=report_file)
+
+
+# Retrieve the default bucket encryption configuration for one bucket and add it to the report.
+def audit_bucket(s3, myBuckets):
+    try:
+        # Run the GetBucketEncryption on all Amazon S3 buckets in all AWS Regions.
+        resp = s3.get_bucket_encryption(Bucket=myBuckets)
+        encryption_rules = resp.get("ServerSideEncryptionConfiguration", {}).get(
+            "Rules", []
+        )
+        if encryption_rules:
+            encryption = encryption_rules[0].get(
+                "ApplyServerSideEncryptionByDefault", {}
+            )
+            if "KMSMasterKeyID" in encryption:
+                kms_key = encryption["KMSMasterKeyID"]
+                bucketKey = str(encryption.get("BucketKeyEnabled", False))
+                report_info(
+                    bucketEncryptionReport,
+                    "{0}, {1}, {2}, {3}".format(
+                        myBuckets, "SSE-KMS", kms_key, bucketKey
+                    ),
+                )
+            else:
+                # Handle SSE-S3 encryption
+                sse_type = encryption.get("SSEAlgorithm", "SSE-S3")
+                report_info(
+                    bucketEncryptionReport,
+                    "{0}, {1}, {2}".format(myBuckets, sse_type, "N/A"),
+                )
+        else:
+            # Handle case where no encryption configuration is found
+            report_info(
+                bucketEncryptionReport,
+                "{0}, {1}, {2}".format(myBuckets, "SSEConfigNotFound", "N/A"),
+            )
+    except s3.exceptions.ClientError as e:
+        error_code = e.response.get("Error", {}).get("Code")
+        if error_code == "AccessDenied":
+            report_info(
+                bucketEncryptionReport,
+                "{0}, {1}, {2}, {3}".format(
+                    myBuckets, "AccessDenied", "Unknown", "AccessDenied"
+                ),
+            )
+        else:
+            raise
+
+
+# Find the region of every bucket. Buckets in us-east-1 have no LocationConstraint.
+def get_bucket_regions(s3, buckets):
+    bucket_regions = {}
+    for bucket in buckets:
+        with suppress(Exception):
+            myBuckets = bucket.get("Name")
+            response = s3.get_bucket_location(Bucket=myBuckets)
+            location = response["LocationConstraint"] or "us-east-1"
+            bucket_regions.setdefault(location, []).append(myBuckets)
+    return bucket_regions
 
 
 # Retrieve the default bucket encryption configuration for all buckets in specified AWS Regions.
-def sse_kms_bucket_logger():
+def sse_kms_bucket_logger(regions=regions):
     # Initialize the Amazon S3 boto3 client for us-east-1.
-    s3 = boto3.client("s3", region_name="us-east-1")
+    s3 = get_client("s3", region="us-east-1")
     # List all Amazon S3 buckets in the account.
     response = s3.list_buckets()
     # Retrieve the bucket name from the response
     buckets = response.get("Buckets")
-    # Create a for loop to perform an action on all Amazon S3 buckets in the account.
-    for bucket in buckets:
-        with suppress(Exception):
-            myBuckets = bucket.get("Name")
-            # Sets s3 client region depending on the bucket
-            response = s3.get_bucket_location(Bucket=myBuckets)
-            location = response["LocationConstraint"]
-            if location in regions:
-                s3 = boto3.client("s3", region_name=location)
-                try:
-                    # Run the GetBucketEncryption on all Amazon S3 buckets in all AWS Regions.
-                    resp = s3.get_bucket_encryption(Bucket=myBuckets)
-                    encryption_rules = resp.get(
-                        "ServerSideEncryptionConfiguration", {}
-                    ).get("Rules", [])
-                    if encryption_rules:
-                        encryption = encryption_rules[0].get(
-                            "ApplyServerSideEncryptionByDefault", {}
-                        )
-                        if "KMSMasterKeyID" in encryption:
-                            kms_key = encryption["KMSMasterKeyID"]
-                            bucketKey = str(encryption.get("BucketKeyEnabled", False))
-                            report_info(
-                                bucketEncryptionReport,
-                                "{0}, {1}, {2}, {3}".format(
-                                    myBuckets, "SSE-KMS", kms_key, bucketKey
-                                ),
-                            )
-                        else:
-                            # Handle SSE-S3 encryption
-                            sse_type = encryption.get("SSEAlgorithm", "SSE-S3")
-                            report_info(
-                                bucketEncryptionReport,
-                                "{0}, {1}, {2}".format(myBuckets, sse_type, "N/A"),
-                            )
-                    else:
-                        # Handle case where no encryption configuration is found
-                        report_info(
-                            bucketEncryptionReport,
-                            "{0}, {1}, {2}".format(
-                                myBuckets, "SSEConfigNotFound", "N/A"
-                            ),
-                        )
-                except s3.exceptions.ClientError as e:
-                    error_code = e.response.get("Error", {}).get("Code")
-                    if error_code == "AccessDenied":
-                        report_info(
-                            bucketEncryptionReport,
-                            "{0}, {1}, {2}, {3}".format(
-                                myBuckets, "AccessDenied", "Unknown", "AccessDenied"
-                            ),
-                        )
-                    else:
-                        raise
+    bucket_regions = get_bucket_regions(s3, buckets)
+
+    # Audit each region's buckets with that region's client, all regions at once.
+    def audit_region(region):
+        regional_s3 = get_client("s3", region=region)
+        for myBuckets in bucket_regions.get(region, []):
+            with suppress(Exception):
+                audit_bucket(regional_s3, myBuckets)
+
+    run_in_regions(
+        audit_region, [region for region in regions if region in bucket_regions]
+    )
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        description="Report the default encryption of the S3 buckets in the given regions."
+    )
+    parser.add_argument(
+        "--regions",
+        default=",".join(regions),
+        help="Comma-separated regions to audit, or 'all' for every region enabled in the account (default: %(default)s).",
+    )
+    return parser.parse_args(args)
 
 
 # Execute report function.
 if __name__ == "__main__":
+    args = parse_args()
+    if args.regions == "all":
+        audit_regions = get_enabled_regions()
+    else:
+        audit_regions = args.regions.split(",")
     appendHeaders()
-    sse_kms_bucket_logger()
+    sse_kms_bucket_logger(audit_regions)
     # Print the report's output location.
     print("")
     print("You can now access the report in the following location:  ")
@@ -0,0 +1,89 @@
+"""Cached boto3 sessions and clients shared by the scripts in this repository.
+
+Building a client loads the service model, which costs tens of milliseconds
+and extra memory every time. Scripts ask this module for their clients so
+each (profile, region, service) combination is only built once per process.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+import botocore.session
+from botocore.config import Config
+from botocore.loaders import create_loader
+
+DEFAULT_MAX_POOL_CONNECTIONS = 10
+DEFAULT_RETRY_MODE = "adaptive"
+DEFAULT_MAX_ATTEMPTS = 10
+
+sessions = {}
+clients = {}
+cache_lock = threading.RLock()
+# One model loader for every session, so service models loaded for one
+# profile are reused by clients of every other profile.
+data_loader = create_loader()
+
+
+def get_session(profile=None, region=None):
+    """Return the cached boto3 session for a profile and region.
+
+    None uses the default credential chain and region configuration.
+    """
+    session_key = (profile, region)
+    with cache_lock:
+        if session_key not in sessions:
+            core_session = botocore.session.get_session()
+            core_session.register_component("data_loader", data_loader)
+            sessions[session_key] = boto3.Session(
+                botocore_session=core_session, profile_name=profile, region_name=region
+            )
+            # Each boto3 session appends its data path to the shared loader
+            data_loader.search_paths[:] = list(dict.fromkeys(data_loader.search_paths))
+        return sessions[session_key]
+
+
+def get_client(
+    service,
+    profile=None,
+    region=None,
+    max_pool_connections=DEFAULT_MAX_POOL_CONNECTIONS,
+    retry_mode=DEFAULT_RETRY_MODE,
+):
+    """Return the cached client for a service, profile and region.
+
+    Clients are safe to share between threads; raise max_pool_connections
+    to the number of worker threads that use the client concurrently.
+    """
+    client_key = (profile, region, service, max_pool_connections, retry_mode)
+    with cache_lock:
+        if client_key not in clients:
+            config = Config(
+                max_pool_connections=max_pool_connections,
+                retries={"max_attempts": DEFAULT_MAX_ATTEMPTS, "mode": retry_mode},
+            )
+            clients[client_key] = get_session(profile, region).client(
+                service, config=config
+            )
+        return clients[client_key]
+
+
+def get_enabled_regions(profile=None):
+    """Return the sorted names of the regions enabled for a profile's account."""
+    region = get_session(profile).region_name or "us-east-1"
+    ec2 = get_client("ec2", profile, region)
+    response = ec2.describe_regions(
+        Filters=[
+            {"Name": "opt-in-status", "Values": ["opt-in-not-required", "opted-in"]}
+        ]
+    )
+    return sorted(entry["RegionName"] for entry in response["Regions"])
+
+
+def run_in_regions(check, regions, max_workers=DEFAULT_MAX_POOL_CONNECTIONS):
+    """Call check(region) for each region concurrently.
+
+    Returns a dict of region to the value check returned for it.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {region: executor.submit(check, region) for region in regions}
+        return {region: future.result() for region, future in futures.items()}
@@ -0,0 +1,142 @@
+"""Complete, rate-limited CloudTrail LookupEvents scans shared by the scripts
+in this repository.
+
+LookupEvents returns at most 50 events per call and is limited to about two
+requests per second per account and region. scan_events splits the time
+window into slices, pages through each slice concurrently under one token
+bucket per region, and yields events as soon as their page arrives.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from aws_clients import get_client
+
+LOOKUP_EVENTS_TPS = 2
+DEFAULT_SLICES = 4
+# Pages waiting to be consumed before the slice scanners pause.
+MAX_PENDING_PAGES = 32
+
+rate_limiters = {}
+rate_limiters_lock = threading.Lock()
+
+
+class TokenBucket:
+    """Thread-safe token bucket that lets `rate` calls per second through,
+    with bursts of up to `capacity` calls."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a call is allowed."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def get_rate_limiter(region=None):
+    """Return the LookupEvents token bucket shared by every scan of a region."""
+    with rate_limiters_lock:
+        if region not in rate_limiters:
+            rate_limiters[region] = TokenBucket(LOOKUP_EVENTS_TPS)
+        return rate_limiters[region]
+
+
+def split_time_range(start_time, end_time, slices):
+    """Split [start_time, end_time] into consecutive, equally long slices.
+
+    LookupEvents treats both ends of a range as inclusive, so every slice but
+    the last ends a microsecond before the next one starts and an event on a
+    boundary is returned once.
+    """
+    step = (end_time - start_time) / slices
+    return [
+        (
+            start_time + step * index,
+            (
+                end_time
+                if index == slices - 1
+                else start_time + step * (index + 1) - timedelta(microseconds=1)
+            ),
+        )
+        for index in range(slices)
+    ]
+
+
+def scan_events(
+    start_time,
+    end_time,
+    lookup_attribute=None,
+    slices=DEFAULT_SLICES,
+    region=None,
+):
+    """Yield every event in [start_time, end_time], optionally matching one
+    {"AttributeKey": ..., "AttributeValue": ...} lookup attribute.
+
+    Slices are paged through concurrently, so events arrive newest first
+    within a slice but interleaved across slices.
+    """
+    client = get_client("cloudtrail", region=region, max_pool_connections=slices)
+    rate_limiter = get_rate_limiter(region)
+    pages = queue.Queue(maxsize=MAX_PENDING_PAGES)
+    stopped = threading.Event()
+    slice_done = object()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def scan_slice(slice_start, slice_end):
+        request = {"StartTime": slice_start, "EndTime": slice_end}
+        if lookup_attribute:
+            request["LookupAttributes"] = [lookup_attribute]
+        try:
+            while not stopped.is_set():
+                rate_limiter.acquire()
+                response = client.lookup_events(**request)
+                put(response["Events"])
+                if not response.get("NextToken"):
+                    break
+                request["NextToken"] = response["NextToken"]
+        except Exception as e:
+            put(e)
+        finally:
+            put(slice_done)
+
+    time_slices = split_time_range(start_time, end_time, slices)
+    with ThreadPoolExecutor(max_workers=len(time_slices)) as executor:
+        for slice_start, slice_end in time_slices:
+            executor.submit(scan_slice, slice_start, slice_end)
+        try:
+            remaining = len(time_slices)
+            while remaining:
+                item = pages.get()
+                if item is slice_done:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield from item
+        finally:
+            # Let the scanners stop early if the caller stops reading
+            stopped.set()
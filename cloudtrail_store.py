@@ -0,0 +1,205 @@
+"""Local SQLite store of CloudTrail events for repeated forensic lookups.
+
+Events fetched with LookupEvents are appended to a SQLite file indexed on
+event name, resource name, user and time. Each lookup attribute (for example
+EventName=PutSecretValue or ResourceName=my-secret) remembers the time range
+it has been synced for, so later syncs only fetch what is missing and queries
+are answered locally.
+"""
+
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from aws_clients import get_session
+from cloudtrail_lookup import DEFAULT_SLICES, scan_events
+
+STORE_DIRECTORY = os.path.expanduser("~/.cache/cloudtrail-events")
+# CloudTrail can deliver events up to about 15 minutes late, so each sync
+# re-reads this much before the end of the previous one.
+LATE_DELIVERY_OVERLAP = timedelta(minutes=15)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    event_id TEXT PRIMARY KEY,
+    event_name TEXT,
+    event_source TEXT,
+    event_time REAL,
+    username TEXT,
+    event_json TEXT
+);
+CREATE TABLE IF NOT EXISTS event_resources (
+    event_id TEXT,
+    resource_type TEXT,
+    resource_name TEXT,
+    UNIQUE (event_id, resource_type, resource_name)
+);
+CREATE TABLE IF NOT EXISTS synced_ranges (
+    attribute_key TEXT,
+    attribute_value TEXT,
+    synced_from REAL,
+    synced_until REAL,
+    PRIMARY KEY (attribute_key, attribute_value)
+);
+CREATE INDEX IF NOT EXISTS events_by_name ON events (event_name, event_time);
+CREATE INDEX IF NOT EXISTS events_by_user ON events (username, event_time);
+CREATE INDEX IF NOT EXISTS events_by_time ON events (event_time);
+CREATE INDEX IF NOT EXISTS resources_by_name ON event_resources (resource_name);
+"""
+
+
+def to_timestamp(value):
+    """Convert a datetime to epoch seconds, reading naive datetimes as UTC."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def get_store_path(profile=None, region=None):
+    """Return the default store file for a profile and region."""
+    session = get_session(profile, region)
+    return os.path.join(
+        STORE_DIRECTORY,
+        f"{session.profile_name or 'default'}-{session.region_name or 'default'}.sqlite",
+    )
+
+
+class EventStore:
+    """Append-only CloudTrail event store backed by one SQLite file."""
+
+    def __init__(self, path=None, region=None):
+        self.path = path or get_store_path(region=region)
+        self.region = region
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.executescript(SCHEMA)
+        self.connection.create_function(
+            "REGEXP",
+            2,
+            lambda pattern, value: value is not None
+            and re.search(pattern, value) is not None,
+        )
+
+    def add_events(self, events):
+        """Store events returned by LookupEvents, skipping ones already stored.
+        Returns the number of new events."""
+        added = 0
+        for event in events:
+            cursor = self.connection.execute(
+                "INSERT OR IGNORE INTO events VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    event["EventId"],
+                    event.get("EventName"),
+                    event.get("EventSource"),
+                    to_timestamp(event["EventTime"]),
+                    event.get("Username"),
+                    json.dumps(
+                        {
+                            key: value
+                            for key, value in event.items()
+                            if key != "EventTime"
+                        }
+                    ),
+                ),
+            )
+            if cursor.rowcount:
+                added += 1
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO event_resources VALUES (?, ?, ?)",
+                    [
+                        (
+                            event["EventId"],
+                            resource.get("ResourceType"),
+                            resource.get("ResourceName"),
+                        )
+                        for resource in event.get("Resources", [])
+                    ],
+                )
+        self.connection.commit()
+        return added
+
+    def sync(self, start_time, end_time, lookup_attribute, slices=DEFAULT_SLICES):
+        """Fetch the events matching a lookup attribute in [start_time, end_time]
+        that are not covered by earlier syncs. Returns the number of new events."""
+        key = (lookup_attribute["AttributeKey"], lookup_attribute["AttributeValue"])
+        start, end = to_timestamp(start_time), to_timestamp(end_time)
+        synced = self.connection.execute(
+            "SELECT synced_from, synced_until FROM synced_ranges"
+            " WHERE attribute_key = ? AND attribute_value = ?",
+            key,
+        ).fetchone()
+        if synced is None or end < synced[0] or start > synced[1]:
+            # Nothing synced next to this window yet, so fetch all of it
+            missing_ranges = [(start, end)]
+            synced_from, synced_until = start, end
+        else:
+            missing_ranges = []
+            if start < synced[0]:
+                missing_ranges.append((start, synced[0]))
+            if end > synced[1]:
+                overlap = LATE_DELIVERY_OVERLAP.total_seconds()
+                missing_ranges.append((max(synced[0], synced[1] - overlap), end))
+            synced_from, synced_until = min(start, synced[0]), max(end, synced[1])
+
+        added = 0
+        for range_start, range_end in missing_ranges:
+            added += self.add_events(
+                scan_events(
+                    datetime.fromtimestamp(range_start, timezone.utc),
+                    datetime.fromtimestamp(range_end, timezone.utc),
+                    lookup_attribute,
+                    slices,
+                    self.region,
+                )
+            )
+        self.connection.execute(
+            "INSERT OR REPLACE INTO synced_ranges VALUES (?, ?, ?, ?)",
+            key + (synced_from, synced_until),
+        )
+        self.connection.commit()
+        return added
+
+    def query(
+        self,
+        start_time,
+        end_time,
+        event_names=None,
+        resource_name=None,
+        resource_pattern=None,
+        username=None,
+    ):
+        """Yield stored events in [start_time, end_time], newest first, in the
+        shape LookupEvents returns them. resource_pattern is a regular
+        expression searched in each resource name."""
+        conditions = ["event_time BETWEEN ? AND ?"]
+        parameters = [to_timestamp(start_time), to_timestamp(end_time)]
+        if event_names:
+            conditions.append(f"event_name IN ({', '.join('?' * len(event_names))})")
+            parameters.extend(event_names)
+        if username:
+            conditions.append("username = ?")
+            parameters.append(username)
+        if resource_name is not None:
+            conditions.append(
+                "event_id IN (SELECT event_id FROM event_resources WHERE resource_name = ?)"
+            )
+            parameters.append(resource_name)
+        if resource_pattern is not None:
+            conditions.append(
+                "event_id IN (SELECT event_id FROM event_resources WHERE resource_name REGEXP ?)"
+            )
+            parameters.append(resource_pattern)
+        rows = self.connection.execute(
+            "SELECT event_time, event_json FROM events WHERE "
+            + " AND ".join(conditions)
+            + " ORDER BY event_time DESC",
+            parameters,
+        )
+        for event_time, event_json in rows:
+            event = json.loads(event_json)
+            event["EventTime"] = datetime.fromtimestamp(event_time, timezone.utc)
+            yield event
+
+    def close(self):
+        self.connection.close()
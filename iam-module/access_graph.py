@@ -0,0 +1,354 @@
+import argparse
+import gzip
+import json
+import logging
+from iam_utils import compile_policy, load_snapshot, policy_allows_action
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+
+class AccessGraph:
+    """Who-can-do-what across Identity Center and IAM, built once from snapshots.
+
+    Principals (Identity Center users, IAM users and IAM roles) link to the
+    groups they belong to. Principals and groups link to grants, each of which
+    gives one policy set (a permission set or an entity's own policies) in one
+    account. Only Allow statements are evaluated, as in the rest of this module.
+    IAM permission boundaries limit every grant of their user or role;
+    Identity Center permission set boundaries are not applied.
+    """
+
+    def __init__(self):
+        # principal or group ID -> {"type", "name", "account_id"}
+        self.nodes = {}
+        # principal ID -> group IDs
+        self.memberships = {}
+        # group ID -> member principal IDs
+        self.members = {}
+        # principal or group ID -> [(account ID, policy set ID)]
+        self.grants = {}
+        # policy set ID -> {"name", "policies": {label: document}}
+        self.policy_sets = {}
+        # principal ID -> (boundary policy ARN, document)
+        self.boundaries = {}
+        # policy set ID -> [(principal or group ID, account ID)]
+        self.grantees = {}
+        # (policy set ID or boundary ARN, lower-cased action) -> bool
+        self.verdicts = {}
+        self.missing_policies = set()
+
+    def add_node(self, node_id, node_type, name, account_id=None):
+        self.nodes[node_id] = {
+            "type": node_type,
+            "name": name,
+            "account_id": account_id,
+        }
+
+    def add_membership(self, principal_id, group_id):
+        self.memberships.setdefault(principal_id, []).append(group_id)
+        self.members.setdefault(group_id, []).append(principal_id)
+
+    def add_policy_set(self, policy_set_id, name, policies):
+        self.policy_sets[policy_set_id] = {"name": name, "policies": policies}
+
+    def add_grant(self, grantee_id, account_id, policy_set_id):
+        self.grants.setdefault(grantee_id, []).append((account_id, policy_set_id))
+        self.grantees.setdefault(policy_set_id, []).append((grantee_id, account_id))
+
+    def add_iam_snapshot(self, account_id, snapshot):
+        """Add the users, groups and roles of one account's IAM snapshot."""
+
+        def policy_documents(entity):
+            documents = {}
+            for policy_arn in entity["ManagedPolicies"]:
+                if policy_arn in snapshot["policies"]:
+                    documents[policy_arn] = snapshot["policies"][policy_arn]["Document"]
+                else:
+                    self.missing_policies.add(policy_arn)
+            for policy_name, document in entity["InlinePolicies"].items():
+                documents[f"inline:{policy_name}"] = document
+            return documents
+
+        for entity_type in ["user", "group", "role"]:
+            for name, entity in snapshot[f"{entity_type}s"].items():
+                node_id = f"iam-{entity_type}:{account_id}:{name}"
+                self.add_node(node_id, f"iam-{entity_type}", name, account_id)
+                self.add_policy_set(
+                    node_id, f"{entity_type} {name} policies", policy_documents(entity)
+                )
+                self.add_grant(node_id, account_id, node_id)
+                boundary_arn = entity.get("PermissionsBoundary")
+                if boundary_arn in snapshot["policies"]:
+                    self.boundaries[node_id] = (
+                        boundary_arn,
+                        snapshot["policies"][boundary_arn]["Document"],
+                    )
+                elif boundary_arn:
+                    self.missing_policies.add(boundary_arn)
+        for name, user in snapshot["users"].items():
+            for group_name in user.get("Groups", []):
+                self.add_membership(
+                    f"iam-user:{account_id}:{name}",
+                    f"iam-group:{account_id}:{group_name}",
+                )
+
+    def add_idc_snapshot(self, snapshot, iam_snapshots):
+        """Add the users, groups and permission set assignments of an Identity
+        Center snapshot. Managed policy documents are looked up in the IAM
+        snapshots, customer managed ones in the snapshot of the assigned account."""
+        managed_documents = {}
+        # account ID -> {policy name: document}; IAM policy names are unique per account
+        customer_documents = {}
+        for account_id, iam_snapshot in iam_snapshots.items():
+            customer_documents[account_id] = {}
+            for policy_arn, policy in iam_snapshot["policies"].items():
+                managed_documents.setdefault(policy_arn, policy["Document"])
+                # Only the account's own policies, so an AWS managed policy
+                # with the same name is never picked up
+                if policy_arn.split(":")[4] == account_id:
+                    customer_documents[account_id][policy_arn.rpartition("/")[2]] = (
+                        policy["Document"]
+                    )
+
+        for user in snapshot["Users"]:
+            node_id = f"idc-user:{user['UserName']}"
+            self.add_node(node_id, "idc-user", user["UserName"])
+            for group_id in snapshot["Memberships"].get(user["UserId"], []):
+                self.add_membership(node_id, f"idc-group:{group_id}")
+        for group_id, group_name in snapshot["Groups"].items():
+            self.add_node(f"idc-group:{group_id}", "idc-group", group_name)
+
+        for group_id, assignments in snapshot["GroupAssignments"].items():
+            for assignment in assignments:
+                account_id = assignment["AccountId"]
+                permission_set_arn = assignment["PermissionSetArn"]
+                permission_set = snapshot["PermissionSets"].get(permission_set_arn)
+                if permission_set is None:
+                    continue
+                policy_set_id = f"{permission_set_arn}:{account_id}"
+                if policy_set_id not in self.policy_sets:
+                    policies = {}
+                    for policy_arn in permission_set.get("AWSManagedPolicyArns", []):
+                        if policy_arn in managed_documents:
+                            policies[policy_arn] = managed_documents[policy_arn]
+                        else:
+                            self.missing_policies.add(policy_arn)
+                    account_policies = customer_documents.get(account_id, {})
+                    for policy_name in permission_set["CustomerManagedPolicies"]:
+                        if policy_name in account_policies:
+                            policies[policy_name] = account_policies[policy_name]
+                        else:
+                            self.missing_policies.add(f"{account_id}:{policy_name}")
+                    if permission_set["InlinePolicy"]:
+                        policies["inline"] = json.loads(permission_set["InlinePolicy"])
+                    self.add_policy_set(policy_set_id, permission_set["Name"], policies)
+                self.add_grant(f"idc-group:{group_id}", account_id, policy_set_id)
+
+    def allows(self, policy_set_id, action):
+        """Whether a policy set allows an action, memoized per (set, action)."""
+        verdict_key = (policy_set_id, action.lower())
+        if verdict_key not in self.verdicts:
+            self.verdicts[verdict_key] = any(
+                document_allows(document, action)
+                for document in self.policy_sets[policy_set_id]["policies"].values()
+            )
+        return self.verdicts[verdict_key]
+
+    def boundary_allows(self, principal_id, action):
+        """Whether the principal's permissions boundary, if any, allows an action."""
+        if principal_id not in self.boundaries:
+            return True
+        boundary_arn, document = self.boundaries[principal_id]
+        verdict_key = (boundary_arn, action.lower())
+        if verdict_key not in self.verdicts:
+            self.verdicts[verdict_key] = document_allows(document, action)
+        return self.verdicts[verdict_key]
+
+    def via(self, grantee_id, principal_id):
+        return (
+            "direct" if grantee_id == principal_id else self.nodes[grantee_id]["name"]
+        )
+
+    def who_can(self, action, account_id=None):
+        """Return every principal allowed an action, optionally in one account,
+        as {principal ID: [(account ID, via, policy set name)]}."""
+        principals = {}
+        for policy_set_id, grantees in self.grantees.items():
+            if not self.allows(policy_set_id, action):
+                continue
+            for grantee_id, grant_account_id in grantees:
+                if account_id and grant_account_id != account_id:
+                    continue
+                if self.nodes[grantee_id]["type"].endswith("group"):
+                    principal_ids = self.members.get(grantee_id, [])
+                else:
+                    principal_ids = [grantee_id]
+                for principal_id in principal_ids:
+                    if not self.boundary_allows(principal_id, action):
+                        continue
+                    principals.setdefault(principal_id, []).append(
+                        (
+                            grant_account_id,
+                            self.via(grantee_id, principal_id),
+                            self.policy_sets[policy_set_id]["name"],
+                        )
+                    )
+        return principals
+
+    def what_can(self, principal_id):
+        """Return every grant reaching a principal, directly or through its groups,
+        as [(account ID, via, policy set name, allowed action patterns)]. The
+        patterns are not narrowed by the principal's permissions boundary."""
+        grants = []
+        for grantee_id in [principal_id] + self.memberships.get(principal_id, []):
+            for account_id, policy_set_id in self.grants.get(grantee_id, []):
+                policy_set = self.policy_sets[policy_set_id]
+                actions = sorted(
+                    {
+                        action
+                        for document in policy_set["policies"].values()
+                        for action in allowed_action_patterns(document)
+                    }
+                )
+                grants.append(
+                    (
+                        account_id,
+                        self.via(grantee_id, principal_id),
+                        policy_set["name"],
+                        actions,
+                    )
+                )
+        return grants
+
+    def find_principals(self, name):
+        """Return the principal IDs matching a full ID or a user or role name."""
+        if name in self.nodes:
+            return [name]
+        return [
+            node_id
+            for node_id, node in self.nodes.items()
+            if node["name"] == name and node["type"] != "idc-group"
+        ]
+
+
+def document_allows(document, action):
+    compiled_policy = compile_policy(document)
+    return compiled_policy is not None and (
+        compiled_policy["full_admin"] or policy_allows_action(compiled_policy, action)
+    )
+
+
+def allowed_action_patterns(document):
+    """List the Action patterns of a document's Allow statements, with each
+    NotAction statement shown as NotAction(...)."""
+    statements = document.get("Statement", [])
+    if not isinstance(statements, list):
+        statements = [statements]
+    patterns = []
+    for statement in statements:
+        if not isinstance(statement, dict) or statement.get("Effect") != "Allow":
+            continue
+        if "Action" in statement:
+            actions = statement["Action"]
+            patterns.extend(actions if isinstance(actions, list) else [actions])
+        elif "NotAction" in statement:
+            excluded = statement["NotAction"]
+            excluded = excluded if isinstance(excluded, list) else [excluded]
+            patterns.append(f"NotAction({', '.join(excluded)})")
+    return patterns
+
+
+def build_access_graph(iam_snapshot_paths, idc_snapshot_path=None):
+    """Build the graph from {account ID: IAM snapshot path} and an optional
+    Identity Center snapshot written by IDC_list_user_permissions.py --snapshot."""
+    graph = AccessGraph()
+    iam_snapshots = {
+        account_id: load_snapshot(snapshot_path)
+        for account_id, snapshot_path in iam_snapshot_paths.items()
+    }
+    for account_id, snapshot in iam_snapshots.items():
+        graph.add_iam_snapshot(account_id, snapshot)
+    if idc_snapshot_path:
+        with gzip.open(idc_snapshot_path, "rt") as snapshot_file:
+            graph.add_idc_snapshot(json.load(snapshot_file), iam_snapshots)
+    if graph.missing_policies:
+        logging.warning(
+            f"{len(graph.missing_policies)} policies are not in any snapshot and were skipped: {', '.join(sorted(graph.missing_policies))}"
+        )
+    return graph
+
+
+# Main function
+def main(
+    iam_snapshot_paths, idc_snapshot_path, query, target, account_id=None, humans=False
+):
+    graph = build_access_graph(iam_snapshot_paths, idc_snapshot_path)
+
+    if query == "who-can":
+        principals = graph.who_can(target, account_id)
+        for principal_id, paths in sorted(principals.items()):
+            if humans and graph.nodes[principal_id]["type"] == "iam-role":
+                continue
+            print(f"\n{principal_id}")
+            for grant_account_id, via, policy_set_name in paths:
+                print(f" - {grant_account_id}: {policy_set_name} (via {via})")
+        return
+
+    principal_ids = graph.find_principals(target)
+    if not principal_ids:
+        logging.error(f"Principal {target} not found in the snapshots.")
+        return
+    for principal_id in principal_ids:
+        print(f"\n{principal_id}")
+        if principal_id in graph.boundaries:
+            print(f"Permissions boundary: {graph.boundaries[principal_id][0]}")
+        for grant_account_id, via, policy_set_name, actions in graph.what_can(
+            principal_id
+        ):
+            if account_id and grant_account_id != account_id:
+                continue
+            print(f" - {grant_account_id}: {policy_set_name} (via {via})")
+            for action in actions:
+                print(f"     {action}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Answer who-can and what-can questions offline from IAM and Identity Center snapshots."
+    )
+    parser.add_argument(
+        "query",
+        choices=["who-can", "what-can"],
+        help="who-can lists the principals allowed an action; what-can lists everything a principal is granted.",
+    )
+    parser.add_argument(
+        "target",
+        help="The action for who-can (e.g., ssm:StartSession), or the user, role or principal ID for what-can.",
+    )
+    parser.add_argument(
+        "--iam-snapshot",
+        action="append",
+        default=[],
+        metavar="ACCOUNT_ID=PATH",
+        help="An account's IAM snapshot written with --snapshot. Repeat for each account.",
+    )
+    parser.add_argument(
+        "--idc-snapshot",
+        help="Identity Center snapshot written by IDC_list_user_permissions.py --snapshot.",
+    )
+    parser.add_argument("--account", help="Only report grants in this account ID.")
+    parser.add_argument(
+        "--humans",
+        action="store_true",
+        help="Leave IAM roles out of who-can results.",
+    )
+    args = parser.parse_args()
+    main(
+        dict(snapshot.split("=", 1) for snapshot in args.iam_snapshot),
+        args.idc_snapshot,
+        args.query,
+        args.target,
+        args.account,
+        args.humans,
+    )
@@ -1,26 +1,38 @@
 import argparse
 import logging
-import boto3
 from iam_utils import (
     get_groups,
     get_managed_policies,
     get_inline_policies,
     get_permission_boundaries,
     analyze_policies,
+    get_account_snapshot,
+    get_iam_client,
 )
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 
+
 # Main function
-def main(service, permissions, single_group=None):
-    iam = boto3.client("iam")
+def main(service, permissions, single_group=None, snapshot_path=None):
+    iam = get_iam_client()
 
     # Split permissions into a list
     permissions_list = permissions.split(",")
 
     # Retrieve groups
-    groups = [single_group] if single_group else get_groups()
+    # Checking every group works offline against a single account snapshot,
+    # which is read from or saved to --snapshot when given
+    snapshot = (
+        get_account_snapshot(iam, snapshot_path)
+        if snapshot_path or not single_group
+        else None
+    )
+    if snapshot is not None and single_group and single_group not in snapshot["groups"]:
+        logging.error(f"Group {single_group} not found in the IAM snapshot.")
+        return
+    groups = [single_group] if single_group else get_groups(snapshot)
     # logging.info(f"Groups to be checked: {groups}")
 
     service_groups = {}
@@ -29,65 +41,75 @@ def main(service, permissions, single_group=None):
     for group_name in groups:
         # logging.info(f"Analyzing policies for group: {group_name}")
 
-        managed_policies = get_managed_policies(group_name, "group")
+        managed_policies = get_managed_policies(group_name, "group", snapshot)
         # logging.info(f"Managed policies for {group_name}: {managed_policies}")
 
-        inline_policies = get_inline_policies(group_name, "group")
+        inline_policies = get_inline_policies(group_name, "group", snapshot)
         # logging.info(f"Inline policies for {group_name}: {inline_policies}")
 
-        permission_boundary = get_permission_boundaries(group_name, "group")
+        permission_boundary = get_permission_boundaries(group_name, "group", snapshot)
         # logging.info(f"Permission boundary for {group_name}: {permission_boundary}")
 
-        policies_with_access = set()
-
-        for permission in permissions_list:
-            managed_policies_with_access = analyze_policies(
-                managed_policies,
-                iam,
-                service,
-                permission,
-                "Managed Policy",
-                group_name,
-                "group",
-            )
-            inline_policies_with_access = analyze_policies(
-                inline_policies,
+        # Evaluate every requested permission in one pass per policy document
+        access_matrix = {permission: [] for permission in permissions_list}
+        managed_policies_with_access = analyze_policies(
+            managed_policies,
+            iam,
+            service,
+            permissions,
+            "Managed Policy",
+            group_name,
+            "group",
+            access_matrix,
+        )
+        inline_policies_with_access = analyze_policies(
+            inline_policies,
+            iam,
+            service,
+            permissions,
+            "Inline Policy",
+            group_name,
+            "group",
+            access_matrix,
+        )
+        permission_boundary_with_access = (
+            analyze_policies(
+                [permission_boundary],
                 iam,
                 service,
-                permission,
-                "Inline Policy",
+                permissions,
+                "Permission Boundary",
                 group_name,
                 "group",
+                access_matrix,
             )
-            permission_boundary_with_access = (
-                analyze_policies(
-                    [permission_boundary],
-                    iam,
-                    service,
-                    permission,
-                    "Permission Boundary",
-                    group_name,
-                    "group",
-                )
-                if permission_boundary
-                else []
-            )
+            if permission_boundary
+            else []
+        )
 
-            policies_with_access.update(
-                managed_policies_with_access
-                + inline_policies_with_access
-                + permission_boundary_with_access
-            )
+        policies_with_access = (
+            managed_policies_with_access
+            + inline_policies_with_access
+            + permission_boundary_with_access
+        )
 
         if policies_with_access:
-            service_groups[group_name] = list(policies_with_access)
+            service_groups[group_name] = (policies_with_access, access_matrix)
 
     # Print results
-    for group, policies in service_groups.items():
+    for group, (policies, access_matrix) in service_groups.items():
         print(f"\nGroup: {group}")
         print("Policies with Access:")
         for policy in policies:
             print(f" - {policy}")
+        print("Actions:")
+        for permission, granting_policies in access_matrix.items():
+            if granting_policies:
+                print(
+                    f" - {service}:{permission}: allowed by {', '.join(granting_policies)}"
+                )
+            else:
+                print(f" - {service}:{permission}: not allowed")
 
     logging.info(
         "Be advised that this only checks for permissions directly attached to the group. It does not check for permissions given through roles or permissions directly attached to users."
@@ -107,5 +129,9 @@ if __name__ == "__main__":
         help="The permissions to check (e.g., RegisterTaskDefinition,RunTask,StartTask).",
     )
     parser.add_argument("--group", help="Specify a single group to check.")
+    parser.add_argument(
+        "--snapshot",
+        help="Path to an IAM snapshot file. It is created on first use and answered from offline afterwards.",
+    )
     args = parser.parse_args()
-    main(args.service, args.permissions, args.group)
+    main(args.service, args.permissions, args.group, args.snapshot)
@@ -1,26 +1,38 @@
 import argparse
 import logging
-import boto3
 from iam_utils import (
     get_roles,
     get_managed_policies,
     get_inline_policies,
     get_permission_boundaries,
     analyze_policies,
+    get_account_snapshot,
+    get_iam_client,
 )
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 
+
 # Main function
-def main(service, permissions, single_role=None):
-    iam = boto3.client("iam")
+def main(service, permissions, single_role=None, snapshot_path=None):
+    iam = get_iam_client()
 
     # Split permissions into a list
     permissions_list = permissions.split(",")
 
     # Retrieve roles
-    roles = [single_role] if single_role else get_roles()
+    # Checking every role works offline against a single account snapshot,
+    # which is read from or saved to --snapshot when given
+    snapshot = (
+        get_account_snapshot(iam, snapshot_path)
+        if snapshot_path or not single_role
+        else None
+    )
+    if snapshot is not None and single_role and single_role not in snapshot["roles"]:
+        logging.error(f"Role {single_role} not found in the IAM snapshot.")
+        return
+    roles = [single_role] if single_role else get_roles(snapshot)
     # logging.info(f"Roles to be checked: {roles}")
 
     service_roles = {}
@@ -29,65 +41,75 @@ def main(service, permissions, single_role=None):
     for role_name in roles:
         # logging.info(f"Analyzing policies for role: {role_name}")
 
-        managed_policies = get_managed_policies(role_name, "role")
+        managed_policies = get_managed_policies(role_name, "role", snapshot)
         # logging.info(f"Managed policies for {role_name}: {managed_policies}")
 
-        inline_policies = get_inline_policies(role_name, "role")
+        inline_policies = get_inline_policies(role_name, "role", snapshot)
         # logging.info(f"Inline policies for {role_name}: {inline_policies}")
 
-        permission_boundary = get_permission_boundaries(role_name, "role")
+        permission_boundary = get_permission_boundaries(role_name, "role", snapshot)
         # logging.info(f"Permission boundary for {role_name}: {permission_boundary}")
 
-        policies_with_access = set()
-
-        for permission in permissions_list:
-            managed_policies_with_access = analyze_policies(
-                managed_policies,
-                iam,
-                service,
-                permission,
-                "Managed Policy",
-                role_name,
-                "role",
-            )
-            inline_policies_with_access = analyze_policies(
-                inline_policies,
+        # Evaluate every requested permission in one pass per policy document
+        access_matrix = {permission: [] for permission in permissions_list}
+        managed_policies_with_access = analyze_policies(
+            managed_policies,
+            iam,
+            service,
+            permissions,
+            "Managed Policy",
+            role_name,
+            "role",
+            access_matrix,
+        )
+        inline_policies_with_access = analyze_policies(
+            inline_policies,
+            iam,
+            service,
+            permissions,
+            "Inline Policy",
+            role_name,
+            "role",
+            access_matrix,
+        )
+        permission_boundary_with_access = (
+            analyze_policies(
+                [permission_boundary],
                 iam,
                 service,
-                permission,
-                "Inline Policy",
+                permissions,
+                "Permission Boundary",
                 role_name,
                 "role",
+                access_matrix,
             )
-            permission_boundary_with_access = (
-                analyze_policies(
-                    [permission_boundary],
-                    iam,
-                    service,
-                    permission,
-                    "Permission Boundary",
-                    role_name,
-                    "role",
-                )
-                if permission_boundary
-                else []
-            )
+            if permission_boundary
+            else []
+        )
 
-            policies_with_access.update(
-                managed_policies_with_access
-                + inline_policies_with_access
-                + permission_boundary_with_access
-            )
+        policies_with_access = (
+            managed_policies_with_access
+            + inline_policies_with_access
+            + permission_boundary_with_access
+        )
 
         if policies_with_access:
-            service_roles[role_name] = list(policies_with_access)
+            service_roles[role_name] = (policies_with_access, access_matrix)
 
     # Print results
-    for role, policies in service_roles.items():
+    for role, (policies, access_matrix) in service_roles.items():
         print(f"\nRole: {role}")
         print("Policies with Access:")
         for policy in policies:
             print(f" - {policy}")
+        print("Actions:")
+        for permission, granting_policies in access_matrix.items():
+            if granting_policies:
+                print(
+                    f" - {service}:{permission}: allowed by {', '.join(granting_policies)}"
+                )
+            else:
+                print(f" - {service}:{permission}: not allowed")
 
     logging.info(
         "Be advised that this only checks for permissions directly attached to the roles. It does not check for permissions given to groups or users."
@@ -107,5 +129,9 @@ if __name__ == "__main__":
         help="The permissions to check (e.g., RegisterTaskDefinition,RunTask,StartTask).",
     )
     parser.add_argument("--role", help="Specify a single role to check.")
+    parser.add_argument(
+        "--snapshot",
+        help="Path to an IAM snapshot file. It is created on first use and answered from offline afterwards.",
+    )
     args = parser.parse_args()
-    main(args.service, args.permissions, args.role)
+    main(args.service, args.permissions, args.role, args.snapshot)
@@ -1,26 +1,38 @@
 import argparse
 import logging
-import boto3
 from iam_utils import (
     get_users,
     get_managed_policies,
     get_inline_policies,
     get_permission_boundaries,
     analyze_policies,
+    get_account_snapshot,
+    get_iam_client,
 )
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 
+
 # Main function
-def main(service, permissions, single_user=None):
-    iam = boto3.client("iam")
+def main(service, permissions, single_user=None, snapshot_path=None):
+    iam = get_iam_client()
 
     # Split permissions into a list
     permissions_list = permissions.split(",")
 
     # Retrieve users
-    users = [single_user] if single_user else get_users()
+    # Checking every user works offline against a single account snapshot,
+    # which is read from or saved to --snapshot when given
+    snapshot = (
+        get_account_snapshot(iam, snapshot_path)
+        if snapshot_path or not single_user
+        else None
+    )
+    if snapshot is not None and single_user and single_user not in snapshot["users"]:
+        logging.error(f"User {single_user} not found in the IAM snapshot.")
+        return
+    users = [single_user] if single_user else get_users(snapshot)
     # logging.info(f"Users to be checked: {users}")
 
     service_users = {}
@@ -29,65 +41,75 @@ def main(service, permissions, single_user=None):
     for user_name in users:
         # logging.info(f"Analyzing policies for user: {user_name}")
 
-        managed_policies = get_managed_policies(user_name, "user")
+        managed_policies = get_managed_policies(user_name, "user", snapshot)
         # logging.info(f"Managed policies for {user_name}: {managed_policies}")
 
-        inline_policies = get_inline_policies(user_name, "user")
+        inline_policies = get_inline_policies(user_name, "user", snapshot)
         # logging.info(f"Inline policies for {user_name}: {inline_policies}")
 
-        permission_boundary = get_permission_boundaries(user_name, "user")
+        permission_boundary = get_permission_boundaries(user_name, "user", snapshot)
         # logging.info(f"Permission boundary for {user_name}: {permission_boundary}")
 
-        policies_with_access = set()
-
-        for permission in permissions_list:
-            managed_policies_with_access = analyze_policies(
-                managed_policies,
-                iam,
-                service,
-                permission,
-                "Managed Policy",
-                user_name,
-                "user",
-            )
-            inline_policies_with_access = analyze_policies(
-                inline_policies,
+        # Evaluate every requested permission in one pass per policy document
+        access_matrix = {permission: [] for permission in permissions_list}
+        managed_policies_with_access = analyze_policies(
+            managed_policies,
+            iam,
+            service,
+            permissions,
+            "Managed Policy",
+            user_name,
+            "user",
+            access_matrix,
+        )
+        inline_policies_with_access = analyze_policies(
+            inline_policies,
+            iam,
+            service,
+            permissions,
+            "Inline Policy",
+            user_name,
+            "user",
+            access_matrix,
+        )
+        permission_boundary_with_access = (
+            analyze_policies(
+                [permission_boundary],
                 iam,
                 service,
-                permission,
-                "Inline Policy",
+                permissions,
+                "Permission Boundary",
                 user_name,
                 "user",
+                access_matrix,
             )
-            permission_boundary_with_access = (
-                analyze_policies(
-                    [permission_boundary],
-                    iam,
-                    service,
-                    permission,
-                    "Permission Boundary",
-                    user_name,
-                    "user",
-                )
-                if permission_boundary
-                else []
-            )
+            if permission_boundary
+            else []
+        )
 
-            policies_with_access.update(
-                managed_policies_with_access
-                + inline_policies_with_access
-                + permission_boundary_with_access
-            )
+        policies_with_access = (
+            managed_policies_with_access
+            + inline_policies_with_access
+            + permission_boundary_with_access
+        )
 
         if policies_with_access:
-            service_users[user_name] = list(policies_with_access)
+            service_users[user_name] = (policies_with_access, access_matrix)
 
     # Print results
-    for user, policies in service_users.items():
+    for user, (policies, access_matrix) in service_users.items():
         print(f"\nUser: {user}")
         print("Policies with Access:")
         for policy in policies:
             print(f" - {policy}")
+        print("Actions:")
+        for permission, granting_policies in access_matrix.items():
+            if granting_policies:
+                print(
+                    f" - {service}:{permission}: allowed by {', '.join(granting_policies)}"
+                )
+            else:
+                print(f" - {service}:{permission}: not allowed")
 
     logging.info(
         "Be advised that this only checks for permissions directly attached to the user. It does not check for permissions given through roles or through groups."
@@ -107,5 +129,9 @@ if __name__ == "__main__":
         help="The permissions to check (e.g., RegisterTaskDefinition,RunTask,StartTask).",
     )
     parser.add_argument("--user", help="Specify a single user to check.")
+    parser.add_argument(
+        "--snapshot",
+        help="Path to an IAM snapshot file. It is created on first use and answered from offline afterwards.",
+    )
     args = parser.parse_args()
-    main(args.service, args.permissions, args.user)
+    main(args.service, args.permissions, args.user, args.snapshot)
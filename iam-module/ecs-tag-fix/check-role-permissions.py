@@ -1,7 +1,7 @@
 import argparse
 import logging
-import boto3
 from iam_utils import (
+    get_iam_client,
     get_roles,
     get_managed_policies,
     get_inline_policies,
@@ -14,7 +14,7 @@ logging.basicConfig(level=logging.INFO, format="%(message)s")
 
 # Main function
 def main(service, permissions, single_role=None):
-    iam = boto3.client("iam")
+    iam = get_iam_client()
 
     # Split permissions into a list
     permissions_list = permissions.split(",")
@@ -1,12 +1,25 @@
 import logging
-import boto3
+import os
 import re
+import sys
+
+# The shared client factory lives in the repository root.
+sys.path.insert(
+    0,
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+)
+from aws_clients import get_client
 
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 
 
+def get_iam_client():
+    """Return the IAM client shared by every helper in this module."""
+    return get_client("iam")
+
+
 def get_users():
-    iam = boto3.client("iam")
+    iam = get_iam_client()
     paginator = iam.get_paginator("list_users")
     users = []
     for page in paginator.paginate():
@@ -16,7 +29,7 @@ def get_users():
 
 
 def get_groups():
-    iam = boto3.client("iam")
+    iam = get_iam_client()
     paginator = iam.get_paginator("list_groups")
     groups = []
     for page in paginator.paginate():
@@ -26,7 +39,7 @@ def get_groups():
 
 
 def get_roles():
-    iam = boto3.client("iam")
+    iam = get_iam_client()
     paginator = iam.get_paginator("list_roles")
     roles = []
     for page in paginator.paginate():
@@ -36,7 +49,7 @@ def get_roles():
 
 
 def get_managed_policies(entity_name, entity_type):
-    iam = boto3.client("iam")
+    iam = get_iam_client()
     if entity_type == "user":
         attached_policies = iam.list_attached_user_policies(UserName=entity_name)[
             "AttachedPolicies"
@@ -54,7 +67,7 @@ def get_managed_policies(entity_name, entity_type):
 
 
 def get_inline_policies(entity_name, entity_type):
-    iam = boto3.client("iam")
+    iam = get_iam_client()
     if entity_type == "user":
         inline_policy_names = iam.list_user_policies(UserName=entity_name)[
             "PolicyNames"
@@ -86,7 +99,7 @@ def get_inline_policies(entity_name, entity_type):
 
 
 def get_permission_boundaries(entity_name, entity_type):
-    iam = boto3.client("iam")
+    iam = get_iam_client()
     entity = None
     if entity_type == "user":
         entity = iam.get_user(UserName=entity_name)["User"]
@@ -1,12 +1,46 @@
+import gzip
+import json
 import logging
-import boto3
+import os
 import re
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from botocore.exceptions import ClientError
 
-logging.basicConfig(level=logging.INFO, format="%(message)s")
+# The shared client factory lives in the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aws_clients import get_client
 
+logging.basicConfig(level=logging.INFO, format="%(message)s")
 
-def get_users():
-    iam = boto3.client("iam")
+# Policy documents keyed by (PolicyArn, DefaultVersionId), shared by every
+# analyze_policies call in the run so each distinct policy is fetched once.
+policy_document_cache = {}
+# Default version of each managed policy ARN, filled by load_policy_versions
+# or lazily through get_policy.
+policy_default_versions = {}
+# Analysis results for each policy document object (its compiled action
+# index and any memoized verdicts), keyed by id(). Every attachment of a
+# managed policy resolves to the same cached document object, so lookups
+# never re-serialize the document. Each entry keeps the document so the id
+# cannot be reused while the entry exists.
+policy_analysis_cache = {}
+
+# Worker threads used when entities are fetched one by one. The shared IAM
+# client keeps a connection per worker and backs off adaptively when IAM
+# returns Throttling errors.
+DEFAULT_MAX_WORKERS = 16
+
+
+def get_iam_client():
+    """Return the IAM client shared by every helper in this module."""
+    return get_client("iam", max_pool_connections=DEFAULT_MAX_WORKERS)
+
+
+def get_users(snapshot=None):
+    if snapshot is not None:
+        return list(snapshot["users"])
+    iam = get_iam_client()
     paginator = iam.get_paginator("list_users")
     users = []
     for page in paginator.paginate():
@@ -15,8 +49,10 @@ def get_users():
     return users
 
 
-def get_groups():
-    iam = boto3.client("iam")
+def get_groups(snapshot=None):
+    if snapshot is not None:
+        return list(snapshot["groups"])
+    iam = get_iam_client()
     paginator = iam.get_paginator("list_groups")
     groups = []
     for page in paginator.paginate():
@@ -25,8 +61,10 @@ def get_groups():
     return groups
 
 
-def get_roles():
-    iam = boto3.client("iam")
+def get_roles(snapshot=None):
+    if snapshot is not None:
+        return list(snapshot["roles"])
+    iam = get_iam_client()
     paginator = iam.get_paginator("list_roles")
     roles = []
     for page in paginator.paginate():
@@ -35,38 +73,34 @@ def get_roles():
     return roles
 
 
-def get_managed_policies(entity_name, entity_type):
-    iam = boto3.client("iam")
-    if entity_type == "user":
-        attached_policies = iam.list_attached_user_policies(UserName=entity_name)[
-            "AttachedPolicies"
-        ]
-    elif entity_type == "role":
-        attached_policies = iam.list_attached_role_policies(RoleName=entity_name)[
-            "AttachedPolicies"
-        ]
-    elif entity_type == "group":
-        attached_policies = iam.list_attached_group_policies(GroupName=entity_name)[
-            "AttachedPolicies"
-        ]
-    managed_policies = [policy["PolicyArn"] for policy in attached_policies]
+def entity_name_argument(entity_name, entity_type):
+    """Return the UserName, GroupName or RoleName keyword argument for an entity."""
+    return {f"{entity_type.capitalize()}Name": entity_name}
+
+
+def get_managed_policies(entity_name, entity_type, snapshot=None):
+    if snapshot is not None:
+        return snapshot[f"{entity_type}s"][entity_name]["ManagedPolicies"]
+    iam = get_iam_client()
+    paginator = iam.get_paginator(f"list_attached_{entity_type}_policies")
+    managed_policies = [
+        policy["PolicyArn"]
+        for page in paginator.paginate(**entity_name_argument(entity_name, entity_type))
+        for policy in page["AttachedPolicies"]
+    ]
     return managed_policies
 
 
-def get_inline_policies(entity_name, entity_type):
-    iam = boto3.client("iam")
-    if entity_type == "user":
-        inline_policy_names = iam.list_user_policies(UserName=entity_name)[
-            "PolicyNames"
-        ]
-    elif entity_type == "role":
-        inline_policy_names = iam.list_role_policies(RoleName=entity_name)[
-            "PolicyNames"
-        ]
-    elif entity_type == "group":
-        inline_policy_names = iam.list_group_policies(GroupName=entity_name)[
-            "PolicyNames"
-        ]
+def get_inline_policies(entity_name, entity_type, snapshot=None):
+    if snapshot is not None:
+        return list(snapshot[f"{entity_type}s"][entity_name]["InlinePolicies"].items())
+    iam = get_iam_client()
+    paginator = iam.get_paginator(f"list_{entity_type}_policies")
+    inline_policy_names = [
+        policy_name
+        for page in paginator.paginate(**entity_name_argument(entity_name, entity_type))
+        for policy_name in page["PolicyNames"]
+    ]
     policies = []
     for policy_name in inline_policy_names:
         if entity_type == "user":
@@ -85,8 +119,10 @@ def get_inline_policies(entity_name, entity_type):
     return policies
 
 
-def get_permission_boundaries(entity_name, entity_type):
-    iam = boto3.client("iam")
+def get_permission_boundaries(entity_name, entity_type, snapshot=None):
+    if snapshot is not None:
+        return snapshot[f"{entity_type}s"][entity_name].get("PermissionsBoundary")
+    iam = get_iam_client()
     entity = None
     if entity_type == "user":
         entity = iam.get_user(UserName=entity_name)["User"]
@@ -101,122 +137,379 @@ def get_permission_boundaries(entity_name, entity_type):
         return None
 
 
-def extract_root_action(action):
-    action_without_service = re.sub(r"^[a-z0-9]+:", "", action)
-    action_without_wildcard = re.sub(r"\*", "", action_without_service)
-    match = re.match(r"([A-Z][a-z]+)", action_without_wildcard)
-    return match.group(1) if match else action_without_wildcard
-
-
-def extract_service(action):
-    match = re.match(r"([a-z0-9]+):", action)
-    return match.group(1) if match else None
-
-
-def is_full_admin(action):
-    if action in ["*:*", "*"]:
-        return True
-    return False
-
-
-def is_service_admin(action, service):
-    if action == f"{service}:*":
-        return True
-    return False
-
+def load_policy_versions(iam, only_attached=False):
+    """Record the default version of every managed policy in the account, or
+    of only those attached to a user, group or role, and return their ARNs.
+
+    One paginated list_policies call replaces a get_policy call per ARN.
+    """
+    policy_arns = []
+    paginator = iam.get_paginator("list_policies")
+    for page in paginator.paginate(Scope="All", OnlyAttached=only_attached):
+        for policy in page["Policies"]:
+            policy_default_versions[policy["Arn"]] = policy["DefaultVersionId"]
+            policy_arns.append(policy["Arn"])
+    return policy_arns
+
+
+def get_policy_document(iam, policy_arn):
+    """Return the default version document of a managed policy, fetching it
+    only the first time it is requested."""
+    version_id = policy_default_versions.get(policy_arn)
+    if version_id is None:
+        version_id = iam.get_policy(PolicyArn=policy_arn)["Policy"]["DefaultVersionId"]
+        policy_default_versions[policy_arn] = version_id
+    cache_key = (policy_arn, version_id)
+    if cache_key not in policy_document_cache:
+        policy_document_cache[cache_key] = iam.get_policy_version(
+            PolicyArn=policy_arn, VersionId=version_id
+        )["PolicyVersion"]["Document"]
+    return policy_document_cache[cache_key]
+
+
+def load_account_snapshot(iam):
+    """Pull the account's users, groups, roles and managed policies with the
+    paginated get_account_authorization_details call and index them by name.
+
+    Entities map to their attached policy ARNs, inline documents and
+    permission boundary, so the get_* helpers can answer from the snapshot
+    without further API calls. Default policy documents are loaded into the
+    policy document cache.
+    """
+    snapshot = {"users": {}, "groups": {}, "roles": {}, "policies": {}}
+    paginator = iam.get_paginator("get_account_authorization_details")
+    for page in paginator.paginate():
+        for user in page["UserDetailList"]:
+            snapshot["users"][user["UserName"]] = {
+                "ManagedPolicies": [
+                    policy["PolicyArn"]
+                    for policy in user.get("AttachedManagedPolicies", [])
+                ],
+                "InlinePolicies": {
+                    policy["PolicyName"]: policy["PolicyDocument"]
+                    for policy in user.get("UserPolicyList", [])
+                },
+                "PermissionsBoundary": user.get("PermissionsBoundary", {}).get(
+                    "PermissionsBoundaryArn"
+                ),
+                "Groups": user.get("GroupList", []),
+            }
+        for group in page["GroupDetailList"]:
+            snapshot["groups"][group["GroupName"]] = {
+                "ManagedPolicies": [
+                    policy["PolicyArn"]
+                    for policy in group.get("AttachedManagedPolicies", [])
+                ],
+                "InlinePolicies": {
+                    policy["PolicyName"]: policy["PolicyDocument"]
+                    for policy in group.get("GroupPolicyList", [])
+                },
+            }
+        for role in page["RoleDetailList"]:
+            snapshot["roles"][role["RoleName"]] = {
+                "ManagedPolicies": [
+                    policy["PolicyArn"]
+                    for policy in role.get("AttachedManagedPolicies", [])
+                ],
+                "InlinePolicies": {
+                    policy["PolicyName"]: policy["PolicyDocument"]
+                    for policy in role.get("RolePolicyList", [])
+                },
+                "PermissionsBoundary": role.get("PermissionsBoundary", {}).get(
+                    "PermissionsBoundaryArn"
+                ),
+            }
+        for policy in page["Policies"]:
+            for version in policy.get("PolicyVersionList", []):
+                if version["IsDefaultVersion"]:
+                    snapshot["policies"][policy["Arn"]] = {
+                        "DefaultVersionId": version["VersionId"],
+                        "Document": version["Document"],
+                    }
+    cache_snapshot_policies(snapshot)
+    return snapshot
+
+
+def cache_snapshot_policies(snapshot):
+    """Seed the policy document cache with the snapshot's managed policies."""
+    for policy_arn, policy in snapshot["policies"].items():
+        policy_default_versions[policy_arn] = policy["DefaultVersionId"]
+        policy_document_cache[(policy_arn, policy["DefaultVersionId"])] = policy[
+            "Document"
+        ]
 
-def is_exact_permission(action, service, permissions):
-    if action == f"{service}:{permissions}":
-        return True
-    return False
 
+def save_snapshot(snapshot, snapshot_path):
+    """Write the account snapshot to a gzip-compressed JSON file, replacing
+    any previous file in one step so a failed write never leaves a truncated
+    snapshot behind."""
+    temporary_path = f"{snapshot_path}.tmp"
+    with gzip.open(temporary_path, "wt") as snapshot_file:
+        json.dump(snapshot, snapshot_file)
+    os.replace(temporary_path, snapshot_path)
+
+
+def load_snapshot(snapshot_path):
+    """Read an account snapshot written by save_snapshot and seed the policy
+    document cache from it."""
+    with gzip.open(snapshot_path, "rt") as snapshot_file:
+        snapshot = json.load(snapshot_file)
+    cache_snapshot_policies(snapshot)
+    return snapshot
+
+
+def get_account_snapshot(iam, snapshot_path=None):
+    """Return the account snapshot, reading it from snapshot_path when that
+    file exists. Otherwise pull it from IAM and save it to snapshot_path so
+    later runs can answer offline.
+
+    Falls back to a concurrent per-entity crawl when the caller is not
+    allowed to call get_account_authorization_details.
+    """
+    if snapshot_path and os.path.exists(snapshot_path):
+        logging.info(f"Using IAM snapshot {snapshot_path}")
+        return load_snapshot(snapshot_path)
+    try:
+        snapshot = load_account_snapshot(iam)
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ["AccessDenied", "AccessDeniedException"]:
+            raise
+        logging.warning(
+            "Not allowed to call GetAccountAuthorizationDetails, crawling entities one by one."
+        )
+        snapshot = crawl_account_snapshot()
+    if snapshot_path:
+        save_snapshot(snapshot, snapshot_path)
+        logging.info(f"Saved IAM snapshot to {snapshot_path}")
+    return snapshot
+
+
+def fetch_entity_details(entity_name, entity_type):
+    """Fetch one entity's attachments, inline documents and boundary in the
+    same shape as a snapshot entry."""
+    entity = {
+        "ManagedPolicies": get_managed_policies(entity_name, entity_type),
+        "InlinePolicies": dict(get_inline_policies(entity_name, entity_type)),
+    }
+    if entity_type in ["user", "role"]:
+        entity["PermissionsBoundary"] = get_permission_boundaries(
+            entity_name, entity_type
+        )
+    if entity_type == "user":
+        paginator = get_iam_client().get_paginator("list_groups_for_user")
+        entity["Groups"] = [
+            group["GroupName"]
+            for page in paginator.paginate(UserName=entity_name)
+            for group in page["Groups"]
+        ]
+    return entity
+
+
+def fetch_entities(entity_names, entity_type, max_workers=DEFAULT_MAX_WORKERS):
+    """Fetch the details of many entities concurrently, logging progress."""
+    entities = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(fetch_entity_details, entity_name, entity_type): entity_name
+            for entity_name in entity_names
+        }
+        for completed, future in enumerate(as_completed(futures), 1):
+            entities[futures[future]] = future.result()
+            if completed % 100 == 0 or completed == len(futures):
+                logging.info(f"Fetched {completed}/{len(futures)} {entity_type}s")
+    return entities
+
+
+def fetch_policy_documents(policy_arns, max_workers=DEFAULT_MAX_WORKERS):
+    """Fetch the default documents of many managed policies concurrently."""
+    iam = get_iam_client()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        documents = executor.map(
+            lambda policy_arn: get_policy_document(iam, policy_arn), policy_arns
+        )
+        return dict(zip(policy_arns, documents))
+
+
+def crawl_account_snapshot(max_workers=DEFAULT_MAX_WORKERS):
+    """Build an account snapshot with concurrent per-entity calls."""
+    snapshot = {
+        "users": fetch_entities(get_users(), "user", max_workers),
+        "groups": fetch_entities(get_groups(), "group", max_workers),
+        "roles": fetch_entities(get_roles(), "role", max_workers),
+    }
+    policy_arns = sorted(
+        {
+            policy_arn
+            for entities in snapshot.values()
+            for entity in entities.values()
+            for policy_arn in entity["ManagedPolicies"]
+            + [entity.get("PermissionsBoundary")]
+            if policy_arn
+        }
+    )
+    documents = fetch_policy_documents(policy_arns, max_workers)
+    snapshot["policies"] = {
+        policy_arn: {
+            "DefaultVersionId": policy_default_versions[policy_arn],
+            "Document": documents[policy_arn],
+        }
+        for policy_arn in policy_arns
+    }
+    return snapshot
+
+
+def compile_action_patterns(patterns):
+    """Compile IAM action patterns into one case-insensitive regex where `*`
+    matches any run of characters and `?` matches a single character."""
+    if not patterns:
+        return None
+    translated = []
+    for pattern in patterns:
+        translated.append(
+            "".join(
+                ".*" if char == "*" else "." if char == "?" else re.escape(char)
+                for char in pattern.lower()
+            )
+        )
+    return re.compile("(?:" + "|".join(translated) + r")\Z")
 
-def is_permission_with_wildcard(action, service, permission_root):
-    if "*" in action and action.startswith(f"{service}:"):
-        extracted_root_action = extract_root_action(action)
-        if extracted_root_action == permission_root:
-            return True
-    return False
 
+def get_policy_analysis(policy):
+    """Return the dict of cached analysis results for a policy document."""
+    entry = policy_analysis_cache.get(id(policy))
+    if entry is None or entry[0] is not policy:
+        entry = (policy, {})
+        policy_analysis_cache[id(policy)] = entry
+    return entry[1]
 
-def validate_policy_statement(statement):
-    if (
-        isinstance(statement, dict)
-        and "Effect" in statement
-        and statement["Effect"] == "Allow"
-        and "Action" in statement
-    ):
-        actions = statement["Action"]
-        if not isinstance(actions, list):
-            actions = [actions]
-        return True, actions
-    return False, []
 
+def compile_policy(policy):
+    """Compile the Allow statements of a policy document into an action index.
 
-def validate_and_format_policy(policy, permissions):
+    Action patterns are grouped by service and compiled once per service;
+    patterns with a wildcard in the service part are kept under "*". Each
+    Allow statement using NotAction keeps its own matcher. Compiled policies
+    are cached per document object, so a document shared by many entities
+    is compiled once per run.
+    """
     if "Statement" not in policy:
-        return False, None, None
-    permission_root = extract_root_action(permissions)
-    return True, policy["Statement"], permission_root
-
-
-def has_service_access(policy, service, permissions_list):
-    valid_policy, policy_statements, permission_root = validate_and_format_policy(
-        policy, permissions_list[0]
-    )
-    if not valid_policy:
-        return False, False, False
-    for statement in policy_statements:
-        valid_statement, actions = validate_policy_statement(statement)
-        if not valid_statement:
+        return None
+    analysis = get_policy_analysis(policy)
+    if "compiled" in analysis:
+        return analysis["compiled"]
+
+    statements = policy["Statement"]
+    if not isinstance(statements, list):
+        statements = [statements]
+    full_admin = False
+    service_admins = set()
+    service_patterns = {}
+    not_actions = []
+    for statement in statements:
+        if not isinstance(statement, dict) or statement.get("Effect") != "Allow":
             continue
+        if "Action" in statement:
+            actions = statement["Action"]
+            if not isinstance(actions, list):
+                actions = [actions]
+            for action in actions:
+                action = action.lower()
+                if action in ["*", "*:*"]:
+                    full_admin = True
+                service, _, action_name = action.partition(":")
+                if action_name == "*" and "*" not in service and "?" not in service:
+                    service_admins.add(service)
+                if "*" in service or "?" in service:
+                    service = "*"
+                service_patterns.setdefault(service, []).append(action)
+        elif "NotAction" in statement:
+            excluded = statement["NotAction"]
+            if not isinstance(excluded, list):
+                excluded = [excluded]
+            if excluded:  # IAM rejects an empty NotAction, so skip the statement
+                not_actions.append(compile_action_patterns(excluded))
+
+    compiled = {
+        "full_admin": full_admin,
+        "service_admins": service_admins,
+        "actions": {
+            service: compile_action_patterns(patterns)
+            for service, patterns in service_patterns.items()
+        },
+        "not_actions": not_actions,
+    }
+    analysis["compiled"] = compiled
+    return compiled
+
+
+def policy_allows_action(compiled_policy, action):
+    """Check whether a compiled policy allows a `service:Action` string."""
+    action = action.lower()
+    service = action.partition(":")[0]
+    for matcher in (
+        compiled_policy["actions"].get(service),
+        compiled_policy["actions"].get("*"),
+    ):
+        if matcher is not None and matcher.match(action):
+            return True
+    for not_action in compiled_policy["not_actions"]:
+        if not not_action.match(action):
+            return True
+    return False
 
-        for action in actions:
-            action_service = extract_service(action)
-
-            if is_full_admin(action):
-                return True, False, True  # Full admin policy
-
-            if action_service != service:
-                continue
-
-            action_root = extract_root_action(action)
-
-            if is_service_admin(action, service):
-                return True, True, False  # Service admin policy
 
-            for permissions in permissions_list:
-                if is_exact_permission(action, service, permissions):
-                    return True, False, False
+def evaluate_policy(policy, service, permissions_list):
+    """Evaluate every requested permission against a policy in one pass.
 
-                if is_permission_with_wildcard(action, service, permission_root):
-                    return True, False, False
-    return False, False, False
+    Returns the permissions the policy allows, followed by whether it is a
+    service admin policy and whether it is a full admin policy.
+    """
+    compiled_policy = compile_policy(policy)
+    if compiled_policy is None:
+        return [], False, False
+    if compiled_policy["full_admin"]:
+        return list(permissions_list), False, True  # Full admin policy
+    if service.lower() in compiled_policy["service_admins"]:
+        return list(permissions_list), True, False  # Service admin policy
+    allowed_permissions = [
+        permission
+        for permission in permissions_list
+        if policy_allows_action(compiled_policy, f"{service}:{permission}")
+    ]
+    return allowed_permissions, False, False
 
 
 def analyze_policies(
-    policies, iam, service, permissions, policy_type, entity_name, entity_type
+    policies,
+    iam,
+    service,
+    permissions,
+    policy_type,
+    entity_name,
+    entity_type,
+    access_matrix=None,
 ):
+    """Return the policies that grant any of the comma-separated permissions.
+
+    When access_matrix is given, it is filled in the same pass with each
+    permission mapped to the policies that allow it.
+    """
     policies_with_access = []
     permissions_list = permissions.split(",")
     for policy in policies:
         if isinstance(policy, str):  # Managed policies or permission boundary
-            policy_doc = iam.get_policy_version(
-                PolicyArn=policy,
-                VersionId=iam.get_policy(PolicyArn=policy)["Policy"][
-                    "DefaultVersionId"
-                ],
-            )["PolicyVersion"]["Document"]
+            policy_doc = get_policy_document(iam, policy)
             policy_identifier = policy
         else:  # Inline policies
             policy_name, policy_doc = policy
             policy_identifier = policy_name
 
-        has_access, is_service_admin_policy, is_full_admin_policy = has_service_access(
-            policy_doc, service, permissions_list
+        allowed_permissions, is_service_admin_policy, is_full_admin_policy = (
+            evaluate_policy(policy_doc, service, permissions_list)
         )
-        if has_access:
-            policies_with_access.append(f"{policy_type}: {policy_identifier}")
+        if allowed_permissions:
+            policy_label = f"{policy_type}: {policy_identifier}"
+            policies_with_access.append(policy_label)
             if is_full_admin_policy:
                 policies_with_access.append(
                     f" - Note: This policy grants full admin access."
@@ -225,4 +518,7 @@ def analyze_policies(
                 policies_with_access.append(
                     f" - Note: This policy grants {service} admin access."
                 )
+            if access_matrix is not None:
+                for permission in allowed_permissions:
+                    access_matrix.setdefault(permission, []).append(policy_label)
     return policies_with_access
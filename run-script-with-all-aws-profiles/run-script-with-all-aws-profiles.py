@@ -1,12 +1,99 @@
 import os
-import boto3
+import sys
 import subprocess
 import argparse
+import csv
+import importlib.util
+import json
 import shutil
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# The shared session/client factory lives in the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aws_clients import get_client, get_enabled_regions, get_session
 
 # I think the inner script arguments (not this script's) have to be at the end. modify account list at the end of script. see
 # readme for more info
-# python run_script_with_all_aws_profiles.py --include-east IAM_list_iam_users.py --script-args --limit 3 --order desc
+# python run_script_with_all_aws_profiles.py --regions us-east-1,us-west-2 IAM_list_iam_users.py --script-args --limit 3 --order desc
+
+# Keeps lines from profiles running in parallel from interleaving.
+output_lock = threading.RLock()
+
+# Account ID, alias and region of each profile, reused until they are older than the TTL.
+ACCOUNT_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"),
+    ".cache",
+    "run-script-with-all-aws-profiles",
+    "accounts.json",
+)
+ACCOUNT_CACHE_TTL = 24 * 60 * 60
+
+# Finished (profile, script, args) runs, one JSON line each, used by --resume and --retry-failed.
+JOURNAL_PATH = os.path.join(
+    os.path.expanduser("~"),
+    ".cache",
+    "run-script-with-all-aws-profiles",
+    "journal.jsonl",
+)
+
+
+class ThreadPrefixedOutput:
+    """
+    Stand-in for sys.stdout during in-process runs. Lines written by a plugin thread are
+    prefixed with that thread's profile, everything else is passed straight through.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def set_prefix(self, prefix, records=None):
+        self.local.prefix = prefix
+        self.local.buffer = ""
+        self.local.records = records
+
+    def write_line(self, line):
+        record = parse_record(line)
+        if record is not None and self.local.records is not None:
+            self.local.records.append(record)
+        with output_lock:
+            self.stream.write(f"{self.local.prefix}{line}\n")
+
+    def write(self, text):
+        prefix = getattr(self.local, "prefix", None)
+        if prefix is None:
+            return self.stream.write(text)
+        *lines, self.local.buffer = (self.local.buffer + text).split("\n")
+        for line in lines:
+            self.write_line(line)
+        return len(text)
+
+    def flush(self):
+        prefix = getattr(self.local, "prefix", None)
+        if prefix is not None and self.local.buffer:
+            self.write_line(self.local.buffer)
+            self.local.buffer = ""
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def parse_record(line):
+    """
+    Return the JSON object printed on a line of script output, or None for ordinary output.
+    """
+    line = line.strip()
+    if not line.startswith("{"):
+        return None
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
 
 
 def print_divider():
@@ -21,11 +108,10 @@ def get_account_details(profile):
     """
     Retrieve the account alias and account ID using the specified profile.
     """
-    session = boto3.Session(profile_name=profile)
-    client = session.client("sts")
+    client = get_client("sts", profile=profile)
     account_id = client.get_caller_identity().get("Account")
 
-    iam_client = session.client("iam")
+    iam_client = get_client("iam", profile=profile)
     try:
         aliases = iam_client.list_account_aliases()["AccountAliases"]
         account_alias = aliases[0] if aliases else "No alias found"
@@ -36,34 +122,368 @@ def get_account_details(profile):
     return account_alias, account_id
 
 
-def confirm_and_execute(script_name, profile, script_args, no_verify):
+def load_account_cache():
+    """
+    Read the cached account details, or start an empty cache if there is none.
+    """
+    try:
+        with open(ACCOUNT_CACHE_PATH) as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_account_cache(account_cache):
+    """
+    Write the account details cache, replacing the previous file in one step.
+    """
+    os.makedirs(os.path.dirname(ACCOUNT_CACHE_PATH), exist_ok=True)
+    temporary_path = f"{ACCOUNT_CACHE_PATH}.tmp"
+    with open(temporary_path, "w") as cache_file:
+        json.dump(account_cache, cache_file, indent=2)
+    os.replace(temporary_path, ACCOUNT_CACHE_PATH)
+
+
+def resolve_account_details(profiles, refresh=False, max_workers=16):
+    """
+    Return the account ID, alias and region of every profile. Entries missing from the cache
+    or older than ACCOUNT_CACHE_TTL are resolved concurrently and written back to the cache.
+    Profiles whose account can't be resolved are left out.
+    """
+    account_cache = load_account_cache()
+    now = time.time()
+    stale_profiles = [
+        profile
+        for profile in profiles
+        if refresh
+        or profile not in account_cache
+        or now - account_cache[profile]["resolved_at"] > ACCOUNT_CACHE_TTL
+    ]
+
+    def resolve(profile):
+        try:
+            account_alias, account_id = get_account_details(profile)
+        except Exception as e:
+            print(f"Error retrieving account details for profile {profile}: {e}")
+            return None
+        return {
+            "account_id": account_id,
+            "account_alias": account_alias,
+            "region": get_session(profile).region_name,
+            "resolved_at": now,
+        }
+
+    if stale_profiles:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for profile, details in zip(
+                stale_profiles, executor.map(resolve, stale_profiles)
+            ):
+                if details is None:
+                    account_cache.pop(profile, None)
+                    continue
+                if details["account_alias"] == "Error retrieving alias":
+                    # Use it for this run but resolve it again next time
+                    details["resolved_at"] = 0
+                account_cache[profile] = details
+        save_account_cache(account_cache)
+    return {
+        profile: account_cache[profile]
+        for profile in profiles
+        if profile in account_cache
+    }
+
+
+def load_journal(journal_path, script_name, script_args):
+    """
+    Return the latest journaled result of each (profile, region) for this script and these arguments.
+    """
+    script_path = os.path.abspath(script_name)
+    latest_results = {}
+    try:
+        with open(journal_path) as journal_file:
+            for line in journal_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # A line cut short by an interrupted run
+                if entry["script"] == script_path and entry["args"] == (
+                    script_args or []
+                ):
+                    latest_results[(entry["profile"], entry.get("region"))] = entry[
+                        "result"
+                    ]
+    except OSError:
+        pass
+    return latest_results
+
+
+def record_result(journal_path, script_name, script_args, result):
+    """
+    Append a finished run to the journal.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(journal_path)), exist_ok=True)
+    entry = {
+        "profile": result["profile"],
+        "region": result.get("region"),
+        "script": os.path.abspath(script_name),
+        "args": script_args or [],
+        "finished_at": time.time(),
+        "result": result,
+    }
+    with open(journal_path, "a") as journal_file:
+        journal_file.write(json.dumps(entry, default=str) + "\n")
+
+
+def print_prefixed(prefix, line):
+    """
+    Print a line of child output, prefixed with the profile when running in parallel.
+    """
+    line = line.rstrip("\n")
+    with output_lock:
+        print(f"{prefix}{line}", flush=True)
+
+
+def run_script(
+    script_name,
+    profile,
+    script_args,
+    timeout=None,
+    prefix="",
+    records=None,
+    region=None,
+):
+    """
+    Run the script for one profile in a child process, streaming its output as it is produced.
+    The child runs in the given region, or in the profile's default region when it is None.
+    JSON object lines are also appended to records.
+    Returns the exit code and whether the run was killed for exceeding the timeout.
+    """
+    env = dict(os.environ, AWS_PROFILE=profile)
+    region = region or get_session(profile).region_name
+    if region:
+        env["AWS_DEFAULT_REGION"] = region
+    command = [sys.executable, script_name] + (script_args or [])
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        env=env,
+    )
+    timed_out = threading.Event()
+
+    def kill_process():
+        timed_out.set()
+        process.kill()
+
+    timer = threading.Timer(timeout, kill_process) if timeout else None
+    if timer:
+        timer.start()
+    try:
+        for line in process.stdout:
+            print_prefixed(prefix, line)
+            record = parse_record(line)
+            if record is not None and records is not None:
+                records.append(record)
+        exit_code = process.wait()
+    finally:
+        if timer:
+            timer.cancel()
+    return exit_code, timed_out.is_set()
+
+
+def load_plugin(script_name):
+    """
+    Import a script once so it can be run in-process for every profile.
+    The script must define run(session, args), where args is the list of script arguments.
+    """
+    script_path = os.path.abspath(script_name)
+    # Let the script import its neighbours, as it would when run directly
+    sys.path.insert(0, os.path.dirname(script_path))
+    module_name = os.path.splitext(os.path.basename(script_path))[0].replace("-", "_")
+    spec = importlib.util.spec_from_file_location(module_name, script_path)
+    plugin = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(plugin)
+    if not callable(getattr(plugin, "run", None)):
+        print(
+            f"{script_name} does not define run(session, args) and can't be run with --in-process."
+        )
+        sys.exit(1)
+    return plugin
+
+
+def run_plugin(
+    plugin, profile, script_args, timeout=None, prefix="", records=None, region=None
+):
+    """
+    Call the plugin's run(session, args) with the profile's session for the region in a worker thread.
+    JSON object lines it prints are also appended to records.
+    Returns the exit code and whether the run exceeded the timeout. A run that times out
+    can't be stopped and is left to finish in the background.
+    """
+    outcome = {"exit_code": None}
+
+    def call_plugin():
+        if isinstance(sys.stdout, ThreadPrefixedOutput):
+            sys.stdout.set_prefix(prefix, records)
+        try:
+            exit_code = plugin.run(
+                get_session(profile, region), list(script_args or [])
+            )
+            outcome["exit_code"] = exit_code if isinstance(exit_code, int) else 0
+        except SystemExit as e:
+            outcome["exit_code"] = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            sys.stdout.flush()
+            print(traceback.format_exc(), end="")
+            outcome["exit_code"] = 1
+        finally:
+            sys.stdout.flush()
+
+    worker = threading.Thread(target=call_plugin, daemon=True)
+    worker.start()
+    worker.join(timeout)
+    return outcome["exit_code"], worker.is_alive()
+
+
+def execute(
+    script_name,
+    profile,
+    script_args,
+    account,
+    timeout=None,
+    prefix="",
+    plugin=None,
+    region=None,
+):
+    """
+    Run the script for one profile, in a child process or in-process, and return a result record.
+    The JSON records the script printed are tagged with the profile, account and region.
+    """
+    records = []
+    if plugin:
+        exit_code, timed_out = run_plugin(
+            plugin, profile, script_args, timeout, prefix, records, region
+        )
+    else:
+        exit_code, timed_out = run_script(
+            script_name, profile, script_args, timeout, prefix, records, region
+        )
+    region = region or account["region"]
+    tags = {
+        "profile": profile,
+        "account_id": account["account_id"],
+        "account_alias": account["account_alias"],
+        "region": region,
+    }
+    tagged_records = []
+    for record in records:
+        tagged_record = dict(tags)
+        tagged_record.update(
+            (key, value) for key, value in record.items() if key not in tags
+        )
+        tagged_records.append(tagged_record)
+    return {
+        "profile": profile,
+        "region": region,
+        "exit_code": exit_code,
+        "status": "timeout" if timed_out else "ok" if exit_code == 0 else "failed",
+        "records": tagged_records,
+    }
+
+
+def target_label(profile, region):
+    """
+    Return the name a (profile, region) target is shown under in prefixes and the summary.
+    """
+    return f"{profile}/{region}" if region else profile
+
+
+def error_result(profile, region):
+    """
+    Return the result record of a target that could not be run.
+    """
+    return {
+        "profile": profile,
+        "region": region,
+        "exit_code": None,
+        "status": "error",
+        "records": [],
+    }
+
+
+def run_profile(
+    script_name,
+    profile,
+    script_args,
+    account,
+    timeout=None,
+    prefix="",
+    plugin=None,
+    region=None,
+):
+    """
+    Print the account details for a profile, run the script with it in the region and return a result record.
+    """
+    if account is None:
+        print_prefixed(prefix, f"Skipping profile {profile}: account not resolved.")
+        return error_result(profile, region)
+    try:
+        print_prefixed(
+            prefix,
+            f"Profile: {profile}, Account Name (Alias): {account['account_alias']}, Account ID: {account['account_id']}, Region: {region or account['region']}",
+        )
+        return execute(
+            script_name, profile, script_args, account, timeout, prefix, plugin, region
+        )
+    except Exception as e:
+        print_prefixed(
+            prefix, f"Error running {script_name} for profile {profile}: {e}"
+        )
+        return error_result(profile, region)
+
+
+def confirm_and_execute(
+    script_name,
+    profile,
+    script_args,
+    no_verify,
+    account,
+    timeout=None,
+    plugin=None,
+    region=None,
+):
     """
-    Ask for user confirmation before executing the specified script with the given profile.
+    Ask for user confirmation before executing the specified script with the given profile and region.
+    Returns the run's result record, or None if the profile was skipped.
     """
-    account_alias, account_id = get_account_details(profile)
+    if account is None:
+        print(f"Skipping profile {profile}: account not resolved.")
+        print_divider()
+        return error_result(profile, region)
     print(
-        f"Profile: {profile}, Account Name (Alias): {account_alias}, Account ID: {account_id}"
+        f"Profile: {profile}, Account Name (Alias): {account['account_alias']}, Account ID: {account['account_id']}, Region: {region or account['region']}"
     )
 
+    result = None
     if no_verify:
         response = "y"
         print("Running without verification due to --no-verify option.")
     else:
         response = input(
-            f"The command will be run by the following profile: {profile}. Are you sure you want to do this? (Y/N): "
+            f"The command will be run by the following profile: {target_label(profile, region)}. Are you sure you want to do this? (Y/N): "
         )
 
     if response.lower() in ["y", "yes"]:
-        os.environ["AWS_PROFILE"] = profile
-        os.environ["AWS_DEFAULT_REGION"] = boto3.Session(
-            profile_name=profile
-        ).region_name
-        script_args = script_args if script_args is not None else []
-        command = f"python {script_name} {' '.join(script_args)}"
-        result = subprocess.run(command, shell=True, capture_output=True, text=True)
-        print(result.stdout)
-        if result.stderr:
-            print(f"Error: {result.stderr}")
+        result = execute(
+            script_name,
+            profile,
+            script_args,
+            account,
+            timeout,
+            plugin=plugin,
+            region=region,
+        )
     elif response.lower() in ["n", "no"]:
         quit_response = input("Do you want to quit the script? (Y/N): ")
         if quit_response.lower() in ["y", "yes"]:
@@ -72,63 +492,251 @@ def confirm_and_execute(script_name, profile, script_args, no_verify):
         else:
             print("Continuing with the next profile...")
     print_divider()
+    return result
+
+
+def run_in_parallel(
+    script_name,
+    targets,
+    script_args,
+    parallel,
+    accounts,
+    timeout=None,
+    plugin=None,
+    journal_path=None,
+):
+    """
+    Run the script for several (profile, region) targets at once, prefixing each output line
+    with its profile and region. Each result is journaled as soon as its target finishes.
+    """
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        futures = [
+            executor.submit(
+                run_profile,
+                script_name,
+                profile,
+                script_args,
+                accounts.get(profile),
+                timeout,
+                f"[{target_label(profile, region)}] ",
+                plugin,
+                region,
+            )
+            for profile, region in targets
+        ]
+        for future in as_completed(futures):
+            if journal_path:
+                record_result(journal_path, script_name, script_args, future.result())
+        return [future.result() for future in futures]
+
+
+def print_summary(results):
+    """
+    Print the exit status of every profile that was run.
+    """
+    print_divider()
+    print("Summary:")
+    for result in results:
+        exit_code = "" if result["exit_code"] is None else f" ({result['exit_code']})"
+        journaled = " (from journal)" if result.get("from_journal") else ""
+        label = target_label(result["profile"], result.get("region"))
+        print(f"  {label}: {result['status']}{exit_code}{journaled}")
+
+
+def write_records(results, output_path):
+    """
+    Merge the JSON records of every profile into one file, as CSV when output_path ends
+    with .csv and as JSON lines otherwise.
+    """
+    records = [record for result in results for record in result["records"]]
+    if output_path.endswith(".csv"):
+        fieldnames = list(dict.fromkeys(key for record in records for key in record))
+        with open(output_path, "w", newline="") as output_file:
+            writer = csv.DictWriter(output_file, fieldnames=fieldnames)
+            writer.writeheader()
+            for record in records:
+                writer.writerow(
+                    {
+                        key: (
+                            json.dumps(value, default=str)
+                            if isinstance(value, (dict, list))
+                            else value
+                        )
+                        for key, value in record.items()
+                    }
+                )
+    else:
+        with open(output_path, "w") as output_file:
+            for record in records:
+                output_file.write(json.dumps(record, default=str) + "\n")
+    print(f"Wrote {len(records)} records to {output_path}")
+
 
+def resolve_targets(profiles, accounts, regions=None, include_east=False):
+    """
+    Expand each profile into (profile, region) targets. regions is a list of region names,
+    "all" for every region enabled in the profile's account, or None for the profile's
+    default region. include_east adds us-east-1 to the regions of every profile.
+    Profiles whose account could not be resolved get a single target without a region.
+    Returns the targets and an error result for each profile whose enabled regions
+    could not be listed.
+    """
+    region_errors = []
+    if regions == "all":
+
+        def list_enabled_regions(profile):
+            try:
+                return get_enabled_regions(profile)
+            except Exception as e:
+                print(f"Could not list the enabled regions for profile {profile}: {e}")
+                return None
 
-def main(script_name, include_east, no_verify, script_args):
+        resolvable = [profile for profile in profiles if accounts.get(profile)]
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            enabled_regions = dict(
+                zip(resolvable, executor.map(list_enabled_regions, resolvable))
+            )
+
+    targets = []
+    for profile in profiles:
+        account = accounts.get(profile)
+        if account is None:
+            targets.append((profile, None))
+            continue
+        if regions == "all":
+            profile_regions = enabled_regions[profile]
+            if profile_regions is None:
+                region_errors.append(error_result(profile, None))
+                continue
+        else:
+            profile_regions = list(regions or [account["region"]])
+        if include_east:
+            profile_regions.append("us-east-1")
+        for region in dict.fromkeys(profile_regions):
+            targets.append((profile, region))
+    return targets, region_errors
+
+
+def main(
+    script_name,
+    include_east,
+    no_verify,
+    script_args,
+    parallel=1,
+    timeout=None,
+    in_process=False,
+    output=None,
+    refresh_accounts=False,
+    resume=False,
+    retry_failed=False,
+    journal_path=JOURNAL_PATH,
+    regions=None,
+):
     """
-    Run the specified script for each profile after retrieving account details and user confirmation.
+    Run the specified script for each profile and region after retrieving account details and user confirmation.
     """
     # modify list as needed
     profiles = [
         "audit",
-        "audit-east",
         "aws-management-read",
-        "aws-management-read-east",
         "data-science-read",
-        "data-science-read-east",
         "dev-read",
-        "dev-read-east",
         "devops-read",
-        "devops-read-east",
         "finance",
-        "finance-east",
         "healthcareservices-read",
-        "healthcareservices-read-east",
         "inside-response-read",
-        "inside-response-read-east",
         "log-archive",
-        "log-archive-east",
         "marketing-read",
-        "marketing-read-east",
         "paid-social-read",
-        "paid-social-read-east",
         "play-read",
-        "play-read-east",
         "prod-read",
-        "prod-read-east",
         "propulsions-read",
-        "propulsions-read-east",
         "security-compliance-read",
-        "security-compliance-read-east",
         "shared-services-read",
-        "shared-services-read-east",
         "sox-read",
-        "sox-read-east",
         "telecom-read",
-        "telecom-read-east",
         "uat-read",
-        "uat-read-east",
         "selectquote-network-read",
-        "selectquote-network-read-east",
     ]
 
-    if include_east:
-        filtered_profiles = profiles
+    # Resolve every profile's account up front, from the cache where possible
+    accounts = resolve_account_details(profiles, refresh_accounts)
+    targets, region_errors = resolve_targets(profiles, accounts, regions, include_east)
+
+    # Pick up where an earlier sweep of the same script and arguments left off
+    journaled_results = []
+    if resume or retry_failed:
+        latest_results = load_journal(journal_path, script_name, script_args)
+        if retry_failed:
+            targets_to_run = [
+                target
+                for target in targets
+                if target in latest_results and latest_results[target]["status"] != "ok"
+            ]
+        else:
+            targets_to_run = [
+                target
+                for target in targets
+                if latest_results.get(target, {}).get("status") != "ok"
+            ]
+        for target in targets:
+            if target not in targets_to_run and target in latest_results:
+                journaled_results.append(
+                    dict(latest_results[target], from_journal=True)
+                )
+        print(
+            f"Running {len(targets_to_run)} of {len(targets)} profile regions, {len(journaled_results)} taken from the journal."
+        )
+        targets = targets_to_run
+
+    plugin = None
+    if in_process:
+        # Import the script once and prefix its output per profile thread
+        plugin = load_plugin(script_name)
+        sys.stdout = ThreadPrefixedOutput(sys.stdout)
+
+    if parallel > 1:
+        # Profiles can't be confirmed one by one while running concurrently
+        if not no_verify:
+            response = input(
+                f"The command will be run by the following profiles: {', '.join(target_label(*target) for target in targets)}. Are you sure you want to do this? (Y/N): "
+            )
+            if response.lower() not in ["y", "yes"]:
+                print("Exiting the script.")
+                return
+        results = run_in_parallel(
+            script_name,
+            targets,
+            script_args,
+            parallel,
+            accounts,
+            timeout,
+            plugin,
+            journal_path,
+        )
     else:
-        filtered_profiles = [profile for profile in profiles if "-east" not in profile]
+        results = []
+        for profile, region in targets:
+            result = confirm_and_execute(
+                script_name,
+                profile,
+                script_args,
+                no_verify,
+                accounts.get(profile),
+                timeout,
+                plugin,
+                region,
+            )
+            if result:
+                record_result(journal_path, script_name, script_args, result)
+                results.append(result)
 
-    for profile in filtered_profiles:
-        confirm_and_execute(script_name, profile, script_args, no_verify)
+    results = journaled_results + region_errors + results
+    print_summary(results)
+    if output:
+        write_records(results, output)
+    if any(result["status"] != "ok" for result in results):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -139,13 +747,58 @@ if __name__ == "__main__":
     parser.add_argument(
         "--include-east",
         action="store_true",
-        help="Include profiles ending with '-east' when running the script.",
+        help="Also run every profile in us-east-1, in addition to its other regions.",
+    )
+    parser.add_argument(
+        "--regions",
+        type=lambda value: value if value == "all" else value.split(","),
+        help="Comma-separated regions to run every profile in, or 'all' for every region enabled in each account. Defaults to the profile's region.",
     )
     parser.add_argument(
         "--no-verify",
         action="store_true",
         help="Run the script for each profile without verification.",
     )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        default=1,
+        help="Number of profile regions to run at the same time. Output lines are prefixed with the profile and region.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=int,
+        help="Seconds to let the script run for each profile before it is stopped.",
+    )
+    parser.add_argument(
+        "--in-process",
+        action="store_true",
+        help="Import the script once and call its run(session, args) for each profile instead of starting a new Python process.",
+    )
+    parser.add_argument(
+        "--output",
+        help="Write the JSON lines printed by the script for every profile to this file (.csv for CSV, otherwise JSON lines), tagged with profile, account and region.",
+    )
+    parser.add_argument(
+        "--refresh-accounts",
+        action="store_true",
+        help="Resolve every profile's account ID, alias and region again instead of using the cache.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip profile regions that already finished successfully with the same script and arguments.",
+    )
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="Only run profile regions whose last run with the same script and arguments did not succeed.",
+    )
+    parser.add_argument(
+        "--journal",
+        default=JOURNAL_PATH,
+        help=f"Journal of finished runs used by --resume and --retry-failed (default: {JOURNAL_PATH}).",
+    )
     parser.add_argument(
         "--script-args",
         nargs=argparse.REMAINDER,
@@ -153,4 +806,18 @@ if __name__ == "__main__":
     )
     args = parser.parse_args()
 
-    main(args.script_name, args.include_east, args.no_verify, args.script_args)
+    main(
+        args.script_name,
+        args.include_east,
+        args.no_verify,
+        args.script_args,
+        args.parallel,
+        args.timeout,
+        args.in_process,
+        args.output,
+        args.refresh_accounts,
+        args.resume,
+        args.retry_failed,
+        args.journal,
+        args.regions,
+    )
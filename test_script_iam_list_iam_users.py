@@ -1,12 +1,12 @@
-import boto3
 import argparse
+from aws_clients import get_client
 
 
 def list_iam_users(limit, order):
     """
     List IAM users in the specified order up to the given limit.
     """
-    client = boto3.client("iam")
+    client = get_client("iam")
     paginator = client.get_paginator("list_users")
     # Sorting IAM users based on the CreationDate in the specified order
     response = paginator.paginate(PaginationConfig={"MaxItems": limit})